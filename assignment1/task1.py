@@ -1,6 +1,8 @@
 # -*- coding: UTF-8 -*-
 
-from collections import defaultdict
+import codecs
+
+from collections import Counter, defaultdict, deque
 
 
 def check_words(first_word, second_word):
@@ -22,6 +24,143 @@ def check_words(first_word, second_word):
     return True
 
 
+def get_signature(word):
+    """
+    Canonical anagram signature of word: the same for two words exactly when
+    their decoded and lowered letters have equal counts.
+
+    Word is decoded from UTF-8 (if it is not unicode already) and lowered, as
+    in check_words. Signature is a frozenset of (letter, count) pairs, so it is
+    built with one pass over the word, without sorting its letters.
+
+    Unlike check_words, lengths of the encoded words are not compared: letters,
+    that have lower case with another UTF-8 length (e.g. Kelvin sign and 'k'),
+    give equal signatures, while check_words returns False for them.
+
+    Time complexity: O(len(word))
+    """
+    if isinstance(word, str):
+        word = word.decode('utf-8')
+    return frozenset(Counter(word.lower()).iteritems())
+
+
+class AnagramIndex(object):
+    """
+    Keep words grouped by their signature (see get_signature).
+
+    Signature of every word is computed once, when the word is added, and
+    the word is saved in the bucket of its signature. So we don't compare
+    words pairwise: all anagrams of X are just the bucket of signature(X).
+
+    Words are kept as decoded unicode strings. Adding the same word twice
+    doesn't create a duplicate in the bucket.
+
+    Time complexity:
+    * add word: O(len(word))
+    * find anagrams of X: O(len(X)) + size of the answer
+    * group corpus into anagram classes: O(total length of the words)
+    """
+    def __init__(self):
+        self.groups = defaultdict(set)
+
+    def build(self, words):
+        for word in words:
+            self.add_word(word)
+
+    def build_from_file(self, filename):
+        self.build(words_from_file(filename))
+
+    def add_word(self, word):
+        if isinstance(word, str):
+            word = word.decode('utf-8')
+        self.groups[get_signature(word)].add(word)
+
+    def find_anagrams(self, word):
+        """Return sorted list of indexed words that are anagrams of word"""
+        signature = get_signature(word)
+        if signature not in self.groups:
+            return []
+        return sorted(self.groups[signature])
+
+    def get_classes(self):
+        """Return all anagram classes of indexed words as sorted lists"""
+        return [sorted(group) for group in self.groups.itervalues()]
+
+
+def words_from_file(filename):
+    """
+    Get words from file one by one, without loading the whole file.
+    Each line in the file contain one word, empty lines are skipped.
+    """
+    with open(filename, 'r') as f:
+        for line in f:
+            word = line.decode('utf-8').strip()
+            if word:
+                yield word
+
+
+def find_anagram_occurrences(pattern, chunks):
+    """
+    Parameters:
+    -----------
+    pattern: str or unicode
+        word, whose anagrams we want to find in the text
+    chunks: iterable
+        text split into pieces of any length, for example opened file (lines)
+        or list of strings; pieces may be UTF-8 byte strings or unicode
+
+    Yield offset (in characters) of every substring of the text, that is an
+    anagram of pattern in terms of check_words (case insensitive, UTF-8 aware).
+
+    Keep window with last len(pattern) characters of the text and counter
+    diff_counter[letter] = (count in window) - (count in pattern), but only
+    for nonzero values. Also keep number of nonzero values: window is an
+    anagram of pattern exactly when this number is zero. Moving window on one
+    character changes two values of the counter, so every step is O(1).
+
+    Byte strings are decoded incrementally, so a multibyte character can be
+    split between two chunks. Memory is O(len(pattern)): only the window and
+    counter values for letters from the window and from pattern are saved.
+    """
+    if isinstance(pattern, str):
+        pattern = pattern.decode('utf-8')
+    pattern = pattern.lower()
+    pattern_len = len(pattern)
+    if not pattern_len:
+        return
+
+    diff_counter = defaultdict(int)
+    for letter in pattern:
+        diff_counter[letter] -= 1
+    nonzero = [len(diff_counter)]
+
+    def change(letter, delta):
+        value = diff_counter[letter]
+        if not value:
+            nonzero[0] += 1
+        value += delta
+        if value:
+            diff_counter[letter] = value
+        else:
+            del diff_counter[letter]
+            nonzero[0] -= 1
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    window = deque()
+    offset = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = decoder.decode(chunk)
+        for letter in chunk.lower():
+            window.append(letter)
+            change(letter, 1)
+            if len(window) > pattern_len:
+                change(window.popleft(), -1)
+                offset += 1
+            if len(window) == pattern_len and not nonzero[0]:
+                yield offset
+
+
 def main():
     assert check_words('Listen', 'Silent')
     assert check_words('Triangle', 'Integral')
@@ -33,6 +172,27 @@ def main():
     assert not check_words('', 'laLla')
     assert not check_words('white', 'black')
 
+    assert get_signature('Listen') == get_signature('Silent')
+    assert get_signature('Оля') == get_signature(u'ялО')
+    assert get_signature('Apple') != get_signature('Pabble')
+    assert get_signature('\xe2\x84\xaa') == get_signature('k')
+    assert not check_words('\xe2\x84\xaa', 'k')
+
+    index = AnagramIndex()
+    index.build(['Listen', 'Silent', 'enlist', 'Оля', 'Яло', 'white', 'Listen'])
+    assert index.find_anagrams('tinsel') == [u'Listen', u'Silent', u'enlist']
+    assert index.find_anagrams('ЛОЯ') == [u'Оля', u'Яло']
+    assert index.find_anagrams('black') == []
+    assert sorted(index.get_classes()) == [
+        [u'Listen', u'Silent', u'enlist'], [u'white'], [u'Оля', u'Яло'],
+    ]
+
+    assert list(find_anagram_occurrences('ab', ['abBa', 'cab'])) == [0, 2, 5]
+    assert list(find_anagram_occurrences('Оля', ['олЯлоЛ', 'ялx'])) == [0, 2, 4]
+    assert list(find_anagram_occurrences('Оля', ['ол', '\xd1', '\x8f'])) == [0]
+    assert list(find_anagram_occurrences('abc', ['ab'])) == []
+    assert list(find_anagram_occurrences('', ['abc'])) == []
+
 
 if __name__ == '__main__':
     main()
@@ -1,43 +1,57 @@
 # -*- coding: UTF-8 -*-
 
 class ListNode(object):
+    __slots__ = ('value', 'next_node')
+
     def __init__(self, value, next_node=None):
         self.value = value
         self.next_node = next_node
 
 
 class LinkedList(object):
+    """
+    Singly linked list, that keep its length in self.length attribute.
+
+    Length is updated on every list change, so len(list) is O(1) and
+    get_kth_from_end makes only one walk over the list. Nodes have __slots__,
+    so they don't keep per-instance __dict__.
+    """
     def __init__(self):
         self.root = None
+        self.length = 0
 
     def build_from_lst(self, lst):
+        """Add all values from lst on top of the list, keeping their order"""
+        root = self.root
         for index in xrange(len(lst) - 1, -1, -1):
-            self.add_on_top(lst[index])
+            root = ListNode(lst[index], root)
+        self.root = root
+        self.length += len(lst)
 
     def add_on_top(self, value):
         new_root = ListNode(value, self.root)
         self.root = new_root
+        self.length += 1
 
     def __len__(self):
-        start = self.root
-        length = 0
-        while start:
-            length += 1
-            start = start.next_node
-        return length
+        return self.length
 
     def get_kth_from_end(self, k):
-        lst_len = len(self)
-        result_index = lst_len - k - 1
-        if not (0 <= result_index < lst_len):
+        """
+        Return value of k-th node from the end (k = 0 means last node) or
+        None, if there is no such node.
+
+        Because length is known, k-th from the end is (length - k - 1)-th
+        from the start, and we can walk directly to it.
+
+        Time complexity: O(length - k)
+        """
+        result_index = self.length - k - 1
+        if not (0 <= result_index < self.length):
             return None
 
-        index = 0
         start = self.root
-        while start:
-            if index == result_index:
-                break
-            index += 1
+        for _ in xrange(result_index):
             start = start.next_node
         return start.value
 
@@ -55,7 +69,19 @@ def main():
     assert linked_lst.get_kth_from_end(55) is None
     assert linked_lst.get_kth_from_end(-123) is None
 
+    assert len(linked_lst) == len(array)
+    linked_lst.add_on_top(7)
+    assert len(linked_lst) == len(array) + 1
+    assert linked_lst.get_kth_from_end(len(array)) == 7
+    linked_lst.build_from_lst([5, 6])
+    assert len(linked_lst) == len(array) + 3
+    assert linked_lst.get_kth_from_end(len(array) + 2) == 5
+    assert linked_lst.get_kth_from_end(0) == array[-1]
+
+    empty_lst = LinkedList()
+    assert len(empty_lst) == 0
+    assert empty_lst.get_kth_from_end(0) is None
+
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,207 @@
+# -*- coding: UTF-8 -*-
+"""
+Fast loading of the graph input files (input_task1.txt, input_task2.txt formats).
+
+Graph is kept in CSR form: flat integer arrays offsets and targets, where neighbours
+of vertex ver are targets[offsets[ver]:offsets[ver + 1]]. For input_task1.txt format
+values of vertexes are kept in a third sequence (array of 8-byte integers, or list
+if some value doesn't fit in it).
+
+Parsed graph can be saved to a binary sidecar file (graph file name + '.csr'), which
+is loaded on later runs with one read per array instead of parsing the text again.
+Sidecar keeps size and modification time of the text file it was built from, and
+is used only while the text file still has them.
+"""
+
+import os
+import struct
+import sys
+
+from array import array
+
+
+MAGIC = 'CSR1'
+VERSION = 3
+HEADER = struct.Struct('<4sIIQQQd')
+HAS_VALUES = 1
+VALUES_TYPECODE = 'l'
+VALUES_ITEMSIZE = 8
+
+
+class CSRGraph(object):
+    """
+    Graph in CSR form with the same read interface as graphs from get_graph functions.
+
+    If graph has values (input_task1.txt format), graph[ver] is {'value': ..., 'edges': ...}
+    as in assignment2/task1.py, otherwise graph[ver] is array of neighbours as in
+    assignment2/task2.py. Graph can't be changed.
+
+    graph[ver] builds new dict and slice on every call, so hot loops should use
+    graph.value(ver) and graph.edges(ver) instead.
+    """
+    def __init__(self, offsets, targets, values=None):
+        self.offsets = offsets
+        self.targets = targets
+        self.values = values
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return iter(xrange(len(self)))
+
+    def __getitem__(self, ver):
+        if not (0 <= ver < len(self)):
+            raise KeyError(ver)
+        if self.values is None:
+            return self.edges(ver)
+        return {
+            'value': self.values[ver],
+            'edges': self.edges(ver),
+        }
+
+    def value(self, ver):
+        return self.values[ver]
+
+    def edges(self, ver):
+        return self.targets[self.offsets[ver]:self.offsets[ver + 1]]
+
+
+def read_text_graph(filename, with_values):
+    """
+    Parameters:
+    -----------
+    filename: str
+        file in input_task1.txt (with_values=True) or input_task2.txt (with_values=False) format
+    with_values: bool
+        if True, first number in every vertex line is value of vertex, not a neighbour
+
+    Read the whole file at once and split every vertex line only once, so there are no
+    readline calls per vertex and every number is parsed one time.
+    """
+    with open(filename, 'r') as f:
+        lines = f.read().split('\n')
+    n = int(lines[0])
+
+    offsets = array('i', [0]) * (n + 1)
+    targets = array('i')
+    values = [0] * n if with_values else None
+    for ver, line in enumerate(lines[1:n + 1]):
+        numbers = map(int, line.split())
+        if with_values and numbers:
+            values[ver] = numbers[0]
+            targets.extend(numbers[1:])
+        else:
+            targets.extend(numbers)
+        offsets[ver + 1] = len(targets)
+    for ver in xrange(len(lines[1:n + 1]), n):
+        offsets[ver + 1] = len(targets)
+
+    if with_values:
+        values = _pack_values(values)
+    return CSRGraph(offsets, targets, values)
+
+
+def _pack_values(values):
+    """
+    Return values as array of 8-byte integers, or as the same list if some value
+    doesn't fit in it (values in input file are not limited).
+    """
+    try:
+        packed = array(VALUES_TYPECODE, values)
+    except OverflowError:
+        return values
+    if packed.itemsize != VALUES_ITEMSIZE:
+        return values
+    return packed
+
+
+def _write_array(f, values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(f)
+
+
+def _read_array(f, count, typecode='i'):
+    values = array(typecode)
+    values.fromfile(f, count)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def source_stat(filename):
+    """Return (size, modification time) of the text file, saved in sidecar header"""
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime
+
+
+def save_binary(graph, filename, source=(0, 0.0)):
+    """
+    Save graph to binary file: header (magic, version, flags, n, number of targets,
+    size and modification time of the source text file, see source_stat), then offsets and targets as little-endian 4-byte integers and values (if any) as
+    little-endian 8-byte integers. Raise ValueError if values are not packed in array
+    (some value doesn't fit in 8 bytes).
+    """
+    if graph.values is not None and not isinstance(graph.values, array):
+        raise ValueError('values of the graph do not fit in {} bytes'.format(VALUES_ITEMSIZE))
+    flags = HAS_VALUES if graph.values is not None else 0
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, flags, len(graph), len(graph.targets), source[0], source[1]))
+        _write_array(f, graph.offsets)
+        _write_array(f, graph.targets)
+        if graph.values is not None:
+            _write_array(f, graph.values)
+
+
+def load_binary(filename, source=None):
+    """
+    Load graph saved with save_binary. Every array is read with one fromfile call.
+    Raise ValueError if file is not a graph file of current version or is truncated,
+    or if source is given and differs from source saved in the header.
+    """
+    with open(filename, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError('{} is not a graph file'.format(filename))
+        magic, version, flags, n, m, source_size, source_mtime = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a graph file of version {}'.format(filename, VERSION))
+        if source is not None and (source_size, source_mtime) != tuple(source):
+            raise ValueError('{} was saved from another source file'.format(filename))
+        if flags & HAS_VALUES and array(VALUES_TYPECODE).itemsize != VALUES_ITEMSIZE:
+            raise ValueError('{} values are not supported on this platform'.format(filename))
+        try:
+            offsets = _read_array(f, n + 1)
+            targets = _read_array(f, m)
+            values = _read_array(f, n, VALUES_TYPECODE) if flags & HAS_VALUES else None
+        except EOFError:
+            raise ValueError('{} is truncated'.format(filename))
+    return CSRGraph(offsets, targets, values)
+
+
+def load_graph(filename, with_values):
+    """
+    Load graph from text file, using binary sidecar filename + '.csr' if it was saved
+    from the text file with the same size and modification time. Otherwise parse the
+    text file and try to write the sidecar for the next runs. Comparing the saved
+    values (not which file is newer) also catches text file replaced with an older
+    one (cp -p, rsync -t, tar x).
+    """
+    sidecar = filename + '.csr'
+    source = source_stat(filename)
+    if os.path.exists(sidecar):
+        try:
+            graph = load_binary(sidecar, source)
+            if (graph.values is not None) == with_values:
+                return graph
+        except ValueError:
+            pass
+
+    graph = read_text_graph(filename, with_values)
+    try:
+        save_binary(graph, sidecar, source)
+    except (IOError, ValueError):
+        pass
+    return graph
@@ -1,52 +1,135 @@
 # -*- coding: UTF-8 -*-
 
+import os
+import shutil
+import tempfile
+
+from collections import OrderedDict
+
+from graph_io import load_graph, read_text_graph
+
 
 class AncestorsFinder(object):
-    def __init__(self, graph):
+    """
+    Find all ancestors of the vertex, that contain some value.
+
+    Once, in constructor, walk over the graph from the root and save for
+    each vertex its parent (self.parent) and value (self.values) and for
+    each value the vertex, that contain it (self.vertex_by_value). After
+    that for the request find(value) we just go up from the vertex with
+    value to the root without touching the graph itself.
+
+    If cache_size is given, last cache_size answers are kept in LRU cache
+    (self.cache, ordered from the least to the most recently used), so
+    repeated requests for the same value don't walk the graph. Counters
+    self.hits and self.misses show how often the cache helps. Graph should
+    be changed only with set_value and add_leaf methods, which update the
+    index and drop outdated answers from the cache.
+
+    Time complexity:
+    * preprocessing: O(n + m), where n - number of vertexes, m - number of edges in a graph
+    * find(value): O(depth of the vertex with value), O(1) for cached value
+    * set_value: O(1), but clears the cache
+    * add_leaf: O(1)
+    """
+    def __init__(self, graph, cache_size=None):
         self.graph = graph
         self.root = 0
         self.ancestors = None
+        self.parent = None
+        self.values = None
+        self.vertex_by_value = None
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._build_index()
 
     def find(self, value):
+        if self.cache_size:
+            cached = self.cache.pop(value, None)
+            if cached is not None:
+                self.hits += 1
+                self.cache[value] = cached
+                self.ancestors = list(cached)
+                return self.ancestors
+            self.misses += 1
+
         self.ancestors = []
-        self._dfs(self.root, -1, value)
+        ver = self.vertex_by_value.get(value)
+        ver = self.parent[ver] if ver is not None else -1
+        while ver != -1:
+            self.ancestors.append(self.values[ver])
+            ver = self.parent[ver]
+
+        if self.cache_size:
+            self.cache[value] = list(self.ancestors)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
         return self.ancestors
 
-    def _dfs(self, ver, prev, value):
+    def set_value(self, ver, value):
+        """
+        Change value in vertex ver. Old value can be in cached answers for
+        all descendants of ver, so the whole cache is cleared.
         """
-        Parameters:
-        -----------
-        ver: int
-            current vertex, that we want to check; if it contain value that we try to find,
-            stop investigating with dfs graph and build the answer; otherwise make new dfs iteration
-        prev: int
-            previous vertex, from which we can go to current vertex; need for not checking twice one vertex
-        value: int
-            value, that we want to find in a graph (as I understand from task, all the values in a graph
-            should be unique)
-
-        What this function do:
-        * check current vertex: if it contain value, go out from recursion and save all previous vertexes
-          in self.ancestors attribute during the exit. Previous vertexes - vertexes, from which we can go
-          to current. List self.ancestors will be the answer.
-        * Otherwise look through all the vertexes, that we can go from current vertex, and named this vertexes to.
-          If some edge go to previous vertex (from which we go to current), we skip this vertex (don't need to check
-          one vertex twice). Otherwise for all to vertexes start new iteration of dfs method with parameters
-          self._dfs(to, ver, value). If descendants of to vertex do not contain value, go to next to and check
-          it in the same way
-        * If we find vertex with value, we should save all the ancestors of it. So if some descendant of current
-          vertex contain value, we should save it to the result
+        del self.vertex_by_value[self.values[ver]]
+        self.graph[ver]['value'] = value
+        self.values[ver] = value
+        self.vertex_by_value[value] = ver
+        self.cache.clear()
+
+    def add_leaf(self, pnt, value):
+        """
+        Add new vertex with value as a child of pnt and return its number.
+        Only cached answer for value (that it is not in a graph) becomes
+        outdated, so only it is removed from the cache.
+        """
+        ver = len(self.graph)
+        self.graph[pnt]['edges'].append(ver)
+        self.graph[ver] = {
+            'value': value,
+            'edges': [pnt],
+        }
+        self.parent.append(pnt)
+        self.values.append(value)
+        self.vertex_by_value[value] = ver
+        self.cache.pop(value, None)
+        return ver
+
+    def find_many(self, values):
+        """Return list of answers of self.find for every value from values"""
+        return [list(self.find(value)) for value in values]
+
+    def _build_index(self):
+        """
+        Walk over the graph from the root with dfs on explicit stack (so deep
+        trees don't overflow the recursion limit).
+
+        For every vertex save the vertex, from which we came to it, in
+        self.parent (parent of the root is -1), its value in self.values
+        (graph[ver] is read only once per vertex), and save the vertex in
+        self.vertex_by_value by its value (as I understand from task, all the
+        values in a graph should be unique).
 
         Time complexity: O(n + m), where n - number of vertexes, m - number of edges in a graph
         """
-        if self.graph[ver]['value'] == value:
-            return True
-        for to in self.graph[ver]['edges']:
-            if to == prev or not self._dfs(to, ver, value):
-                continue
-            self.ancestors.append(self.graph[ver]['value'])
-            return True
-        return False
+        self.parent = [-1] * len(self.graph)
+        self.values = [None] * len(self.graph)
+        self.vertex_by_value = {}
+        if not len(self.graph):
+            return
+        stack = [self.root]
+        while stack:
+            ver = stack.pop()
+            node = self.graph[ver]
+            self.values[ver] = node['value']
+            self.vertex_by_value[node['value']] = ver
+            for to in node['edges']:
+                if to == self.parent[ver]:
+                    continue
+                self.parent[to] = ver
+                stack.append(to)
 
 
 def get_graph(filename):
@@ -57,6 +140,10 @@ def get_graph(filename):
     Next N lines (indexing starting from 0) have same format:
     First element is value in vertex with number index
     Other elements in line is number of vertexes that are connected with current vertex
+
+    For big graphs use graph_io.load_graph(filename, with_values=True): it returns
+    graph with the same interface, but parses the file in one pass and caches it
+    in binary form.
     """
     g = {}
     with open(filename, 'r') as f:
@@ -80,6 +167,46 @@ def main():
     assert ancestors_finder.find(16) == []
     assert ancestors_finder.find(9) == [16]
     assert ancestors_finder.find(19) == [18, 16]
+    assert ancestors_finder.find(100) == []
+
+    assert ancestors_finder.find_many([5, 19, 16]) == [[3, 9, 16], [18, 16], []]
+
+    cached_finder = AncestorsFinder(graph=get_graph('input_task1.txt'), cache_size=2)
+    assert cached_finder.find_many([5, 5, 19, 5, 9, 19]) == [[3, 9, 16], [3, 9, 16], [18, 16], [3, 9, 16], [16], [18, 16]]
+    assert (cached_finder.hits, cached_finder.misses) == (2, 4)
+    assert cached_finder.cache.keys() == [9, 19]
+    assert cached_finder.find(100) == []
+    cached_finder.add_leaf(7, 100)
+    assert cached_finder.find(100) == [5, 3, 9, 16]
+    cached_finder.set_value(1, 10)
+    assert not cached_finder.cache
+    assert cached_finder.find(100) == [5, 3, 10, 16]
+    assert cached_finder.find(9) == []
+
+    csr_graph = read_text_graph('input_task1.txt', with_values=True)
+    assert len(csr_graph) == len(graph)
+    assert [csr_graph[ver]['value'] for ver in graph] == [graph[ver]['value'] for ver in graph]
+    assert [csr_graph.value(ver) for ver in graph] == [graph[ver]['value'] for ver in graph]
+    assert [list(csr_graph.edges(ver)) for ver in graph] == [graph[ver]['edges'] for ver in graph]
+    assert AncestorsFinder(graph=csr_graph).find_many([5, 11, 19]) == [[3, 9, 16], [], [18, 16]]
+
+    big_values_name = os.path.join(tempfile.mkdtemp(), 'input_big_values.txt')
+    try:
+        with open(big_values_name, 'w') as f:
+            f.write('3\n5000000000 1\n7 0 2\n{}\n'.format(2 ** 70))
+        big_graph = read_text_graph(big_values_name, with_values=True)
+        assert [big_graph.value(ver) for ver in xrange(3)] == [5000000000, 7, 2 ** 70]
+        assert AncestorsFinder(graph=big_graph).find(2 ** 70) == [7, 5000000000]
+        assert AncestorsFinder(graph=load_graph(big_values_name, with_values=True)).find(7) == [5000000000]
+    finally:
+        shutil.rmtree(os.path.dirname(big_values_name))
+
+    n = 10 ** 5
+    path_graph = dict(
+        (index, {'value': index, 'edges': [e for e in (index - 1, index + 1) if 0 <= e < n]})
+        for index in xrange(n)
+    )
+    assert AncestorsFinder(graph=path_graph).find(n - 1) == range(n - 2, -1, -1)
 
 
 if __name__ == '__main__':
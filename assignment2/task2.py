@@ -1,6 +1,13 @@
 # -*- coding: UTF-8 -*-
 
 import math
+import os
+import shutil
+import tempfile
+
+from array import array
+
+from graph_io import load_binary, load_graph, read_text_graph, save_binary, source_stat
 
 
 class LCABuilder(object):
@@ -8,11 +15,21 @@ class LCABuilder(object):
     On this task we should find least common ancestor (lca) of two vertexes. I made this with binary lift method.
 
     Precalculate for each vertexes their first ancestor, second ancestor, foth and so on. Keep this information
-    in 2D array self.parent, so, for example, self.parent[ver][index] means 2^index ancestor of vertex ver
-    (ver=0.. n - 1, index = 0, ... log n; ancestor of root is root). Also save time in and time out for each vertex.
-    This information calculated with dfs. I do this because it gives me to understand with O(1), if one vertex is
-    an ancestor of another (if it's true, time in of ancestor should be earlier and time out later). I implement
-    this check in self._check(first_ver, second_ver) method.
+    in flat array self.parent: self.parent[ver * self.width + index] means 2^index ancestor of vertex ver
+    (ver=0.. n - 1, index = 0, ... log n, self.width = log n + 1; ancestor of root is root). Also save time in
+    and time out for each vertex. This information calculated with dfs. I do this because it gives me to
+    understand with O(1), if one vertex is an ancestor of another (if it's true, time in of ancestor should be
+    earlier and time out later). I implement this check in self._check(first_ver, second_ver) method.
+
+    All tables are typed arrays (array module), so they take 4 bytes per value instead of a Python object
+    per value, and dfs uses explicit stack, so trees of any depth can be processed.
+
+    Dfs also saves depth of every vertex (self.depth, depth of root is 0). With depths and self.parent we can
+    answer requests for k-th ancestor of vertex and for distance between two vertexes.
+
+    After build new leaves can be attached to the tree with add_leaf method without rebuilding. New leaf has
+    no time in and time out, so after the first add_leaf lca is found by comparing depths (_find_by_depth
+    method), which needs only self.parent and self.depth.
 
     This preprocessing are made in build method with O(n log n), where n is a number of vertexes in a graph.
 
@@ -21,61 +38,83 @@ class LCABuilder(object):
     Time complexity:
     * prepocessing: O(n log n)
     * get answer for (A, B) request: O(log n)
+    * get k-th ancestor: O(log k)
+    * get distance between A and B: O(log n)
+    * add leaf: O(log n) amortized
     """
     def __init__(self, graph):
         self.graph = graph
         self.root = 0
         self.two_pow = int(math.ceil(math.log(len(graph), 2)))
+        self.width = self.two_pow + 1
 
-        self.time_in = [0] * len(graph)
-        self.time_out = [0] * len(graph)
-        self.parent = [[0] * (self.two_pow + 1) for _ in xrange(len(graph))]
+        self.depth = array('i', [0]) * len(graph)
+        self.time_in = array('i', [0]) * len(graph)
+        self.time_out = array('i', [0]) * len(graph)
+        self.parent = array('i', [0]) * (len(graph) * self.width)
         self.timer = 1
+        self.incremental = False
 
     def build(self):
         self._dfs(self.root)
 
-    def _dfs(self, ver, pnt=0):
+    def _dfs(self, root):
         """
         Parameters:
         -----------
-        ver: int
-            current vertex, which is investigate on this iteration
-        pnt: int
-            previous vertex, from which we can go to current vertex (closest ancestor of current vertex)
+        root: int
+            vertex, from which we start dfs
 
-        Save time of arrival in vertex. Need for checking if one vertex in an ancestor of another with O(1)
-        time complexity (this checking is implementing in _check method). Save closest ancestor of current
-        vertex ver.
+        Dfs on explicit stack. Vertex ver is pushed to the stack when we first see it, and ~ver (negative
+        number) is pushed under its children, so we pop it when all the descendants of ver are processed.
 
-        We precalculate on previous iterations of dfs answer for all ancestors of current vertex, and now
-        get this ancestors and update information in self.parent array for ver. Go to all of descendants of current
-        vertex and make the same operations.
+        When we come to vertex: save time of arrival in vertex. Need for checking if one vertex in an ancestor
+        of another with O(1) time complexity (this checking is implementing in _check method). Closest
+        ancestor of vertex and depth of vertex were saved, when vertex was pushed to the stack.
 
-        Save leaving time from vertex. Need for checking if one vertex in an ancestor of another with O(1)
-        time complexity (this checking is implementing in _check method
+        We precalculate on previous iterations of dfs answer for all ancestors of current vertex, and now
+        get this ancestors and update information in self.parent array for ver. Push all of descendants of
+        current vertex to the stack.
 
+        When we leave vertex: save leaving time from vertex. Need for checking if one vertex in an ancestor of
+        another with O(1) time complexity (this checking is implementing in _check method).
         """
-        self.time_in[ver] = self.timer
-        self.timer += 1
+        graph, parent, width, depth = self.graph, self.parent, self.width, self.depth
+        time_in, time_out = self.time_in, self.time_out
+        timer = self.timer
 
-        self.parent[ver][0] = pnt
-        for index in xrange(1, self.two_pow + 1):
-            prev = self.parent[ver][index - 1]
-            self.parent[ver][index] = self.parent[prev][index - 1]
-        for index in xrange(len(self.graph[ver])):
-            to = self.graph[ver][index]
-            if to == pnt:
+        parent[root * width] = root
+        stack = [root]
+        while stack:
+            ver = stack.pop()
+            if ver < 0:
+                time_out[~ver] = timer
+                timer += 1
                 continue
-            self._dfs(to, ver)
+            time_in[ver] = timer
+            timer += 1
+
+            row = ver * width
+            for index in xrange(1, width):
+                prev = parent[row + index - 1]
+                parent[row + index] = parent[prev * width + index - 1]
 
-        self.time_out[ver] = self.timer
-        self.timer += 1
+            pnt = parent[row]
+            stack.append(~ver)
+            for to in graph[ver]:
+                if to == pnt:
+                    continue
+                parent[to * width] = ver
+                depth[to] = depth[ver] + 1
+                stack.append(to)
+        self.timer = timer
 
     def find(self, first_ver, second_ver):
         """
         Check if one vertex is an ancestor of another with self._check method.
 
+        Below self.parent[A][step] means self.parent[A * self.width + step].
+
         If this is not true, starting from power log_2(n) (keep this in self.two_pow attribute) try to find
         highest (closest to root) vertex for A, that not the ancestor of B (that vertex C, for which C is
         not the ancestor or B, but self.parent[C][0] - ancestor of B ). We can find this vertex with O(log n)
@@ -90,14 +129,129 @@ class LCABuilder(object):
         Obviously, when step becomes less than zero, the vertex of A will be the desired vertex (A is not an
         ancestor of B, but self.parent[A][0] is an ancestor of B) and self.parent[A][0]will be the answer.
         """
+        if self.incremental:
+            return self._find_by_depth(first_ver, second_ver)
         if self._check(first_ver, second_ver):
             return first_ver
         if self._check(second_ver, first_ver):
             return second_ver
         for step in xrange(self.two_pow, -1, -1):
-            if not self._check(self.parent[first_ver][step], second_ver):
-                first_ver = self.parent[first_ver][step]
-        return self.parent[first_ver][0]
+            ancestor = self.parent[first_ver * self.width + step]
+            if not self._check(ancestor, second_ver):
+                first_ver = ancestor
+        return self.parent[first_ver * self.width]
+
+    def _find_by_depth(self, first_ver, second_ver):
+        """
+        Find lca without time in and time out.
+
+        Lift deeper vertex to the depth of another one (with self.kth_ancestor). If they become equal, this
+        vertex is the answer. Otherwise, starting from the biggest step, jump with both vertexes while their
+        2^step ancestors are different. After that both vertexes are children of lca.
+        """
+        depth, parent, width = self.depth, self.parent, self.width
+        if depth[first_ver] < depth[second_ver]:
+            first_ver, second_ver = second_ver, first_ver
+        first_ver = self.kth_ancestor(first_ver, depth[first_ver] - depth[second_ver])
+        if first_ver == second_ver:
+            return first_ver
+        for step in xrange(width - 1, -1, -1):
+            first_ancestor = parent[first_ver * width + step]
+            second_ancestor = parent[second_ver * width + step]
+            if first_ancestor != second_ancestor:
+                first_ver, second_ver = first_ancestor, second_ancestor
+        return parent[first_ver * width]
+
+    def add_leaf(self, pnt):
+        """
+        Parameters:
+        -----------
+        pnt: int
+            vertex, to which we attach new leaf
+
+        Add new vertex with number n (n is the current number of vertexes) as a child of pnt, update
+        self.graph and return n.
+
+        Row of the new vertex in self.parent is filled from the rows of its ancestors, the same way as in
+        _dfs. Arrays grow with append, so it is amortized O(1) per value. If depth of the new vertex does not
+        fit into the table (2^self.width <= depth), add one more column to the table with _add_level method;
+        it doubles maximal depth, so it happens only O(log n) times.
+        """
+        ver = len(self.depth)
+        self.graph[pnt].append(ver)
+        self.graph[ver] = [pnt]
+
+        self.incremental = True
+        self.depth.append(self.depth[pnt] + 1)
+        self.time_in.append(0)
+        self.time_out.append(0)
+        if self.depth[ver] >= 1 << self.width:
+            self._add_level()
+
+        parent, width = self.parent, self.width
+        parent.append(pnt)
+        for index in xrange(1, width):
+            prev = parent[ver * width + index - 1]
+            parent.append(parent[prev * width + index - 1])
+        return ver
+
+    def _add_level(self):
+        """
+        Rebuild self.parent with one more column: 2^width ancestor of vertex is 2^(width - 1) ancestor of
+        its 2^(width - 1) ancestor, and both of them are already in the old table.
+        """
+        old_parent, old_width = self.parent, self.width
+        width = old_width + 1
+        parent = array('i', [0]) * (len(old_parent) // old_width * width)
+        for ver in xrange(len(old_parent) // old_width):
+            parent[ver * width:ver * width + old_width] = old_parent[ver * old_width:(ver + 1) * old_width]
+            prev = old_parent[ver * old_width + old_width - 1]
+            parent[ver * width + old_width] = old_parent[prev * old_width + old_width - 1]
+        self.parent = parent
+        self.width = width
+        self.two_pow = width - 1
+
+    def find_many(self, pairs):
+        """Return list of answers of self.find for every pair (A, B) from pairs"""
+        find = self.find
+        return [find(first_ver, second_ver) for first_ver, second_ver in pairs]
+
+    def kth_ancestor(self, ver, k):
+        """
+        Return k-th ancestor of ver (k = 0 means ver itself, k = 1 - its parent) or None, if ver
+        has less than k ancestors.
+
+        Write k in binary: 2^index ancestor for every bit index of k is already saved in self.parent,
+        so we make jump for every bit of k.
+        """
+        if not (0 <= k <= self.depth[ver]):
+            return None
+        parent, width = self.parent, self.width
+        index = 0
+        while k:
+            if k & 1:
+                ver = parent[ver * width + index]
+            k >>= 1
+            index += 1
+        return ver
+
+    def kth_ancestor_many(self, requests):
+        """Return list of answers of self.kth_ancestor for every pair (ver, k) from requests"""
+        kth_ancestor = self.kth_ancestor
+        return [kth_ancestor(ver, k) for ver, k in requests]
+
+    def distance(self, first_ver, second_ver):
+        """
+        Return number of edges on the path between two vertexes. Path goes through their lca,
+        so distance is depth(A) + depth(B) - 2 * depth(lca(A, B)).
+        """
+        lca = self.find(first_ver, second_ver)
+        return self.depth[first_ver] + self.depth[second_ver] - 2 * self.depth[lca]
+
+    def distance_many(self, pairs):
+        """Return list of answers of self.distance for every pair (A, B) from pairs"""
+        distance = self.distance
+        return [distance(first_ver, second_ver) for first_ver, second_ver in pairs]
 
     def _check(self, first_ver, second_ver):
         return (
@@ -106,6 +260,89 @@ class LCABuilder(object):
         )
 
 
+class EulerLCABuilder(object):
+    """
+    Another way to find lca of two vertexes, with the same interface as LCABuilder, but with O(1) for request.
+
+    Write Euler tour of the tree: go over the tree with dfs and write down the vertex every time we come to it
+    (first time from its parent, and then every time we come back to it from its child). Tour has 2n - 1
+    elements. Save in self.first[ver] index of the first appearance of ver in the tour. Then lca of A and B is
+    the vertex with minimal depth in the tour between self.first[A] and self.first[B].
+
+    For finding minimum on the segment of the tour use sparse table: self.table[k][i] is minimum on segment
+    [i, i + 2^k). Every segment [l, r] is covered by two segments of length 2^k, where 2^k <= r - l + 1 < 2^(k+1),
+    so minimum is found with two lookups. Elements of the table are keys depth * n + ver, so minimum of keys
+    is the vertex with minimal depth, and the vertex is key % n.
+
+    Time complexity:
+    * prepocessing: O(n log n)
+    * get answer for (A, B) request: O(1)
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.root = 0
+        self.first = array('i', [0]) * len(graph)
+        self.table = None
+
+    def build(self):
+        n = len(self.graph)
+        first = self.first
+        depth = array('i', [0]) * n
+        parent = array('i', [-1]) * n
+        tour = array('l')
+
+        stack = [self.root]
+        while stack:
+            ver = stack.pop()
+            if ver < 0:
+                pnt = parent[~ver]
+                if pnt != -1:
+                    tour.append(depth[pnt] * n + pnt)
+                continue
+            first[ver] = len(tour)
+            tour.append(depth[ver] * n + ver)
+            stack.append(~ver)
+            for to in self.graph[ver]:
+                if to == parent[ver]:
+                    continue
+                parent[to] = ver
+                depth[to] = depth[ver] + 1
+                stack.append(to)
+
+        self.table = [tour]
+        half = 1
+        while 2 * half <= len(tour):
+            prev = self.table[-1]
+            self.table.append(array('l', map(min, prev[:len(prev) - half], prev[half:])))
+            half *= 2
+
+    def find(self, first_ver, second_ver):
+        left, right = self.first[first_ver], self.first[second_ver]
+        if left > right:
+            left, right = right, left
+        k = (right - left + 1).bit_length() - 1
+        row = self.table[k]
+        return min(row[left], row[right - (1 << k) + 1]) % len(self.graph)
+
+    def find_many(self, pairs):
+        """
+        Return list of answers of self.find for every pair (A, B) from pairs.
+
+        The same as self.find, but all attributes are taken once for the whole batch.
+        """
+        first, table, n = self.first, self.table, len(self.graph)
+        result = []
+        append = result.append
+        for first_ver, second_ver in pairs:
+            left, right = first[first_ver], first[second_ver]
+            if left > right:
+                left, right = right, left
+            k = (right - left + 1).bit_length() - 1
+            row = table[k]
+            append(min(row[left], row[right - (1 << k) + 1]) % n)
+        return result
+
+
 def get_graph(filename):
     """
     Build graph from input_task2.txt
@@ -113,6 +350,10 @@ def get_graph(filename):
     First line contain number N of vertex.
     Next N lines (indexing starting from 0) have same format:
     Each line contain number of vertexes that are connected with current vertex
+
+    For big graphs use graph_io.load_graph(filename, with_values=False): it returns
+    graph with the same interface, but parses the file in one pass and caches it
+    in binary form.
     """
     g = {}
     with open(filename, 'r') as f:
@@ -134,6 +375,78 @@ def main():
     assert lca_builder.find(4, 2) == 0 and lca_builder.find(2, 4) == 0
     assert lca_builder.find(3, 7) == 3 and lca_builder.find(7, 3) == 3
 
+    n = 10 ** 5
+    path_graph = dict((index, [e for e in (index - 1, index + 1) if 0 <= e < n]) for index in xrange(n))
+    path_builder = LCABuilder(path_graph)
+    path_builder.build()
+    assert path_builder.find(n - 1, n // 2) == n // 2
+    assert path_builder.find(n - 1, 0) == 0
+
+    assert lca_builder.kth_ancestor(7, 0) == 7
+    assert lca_builder.kth_ancestor(7, 1) == 3
+    assert lca_builder.kth_ancestor(7, 3) == 0
+    assert lca_builder.kth_ancestor(7, 4) is None
+    assert lca_builder.kth_ancestor_many([(6, 2), (5, 2), (0, 1)]) == [1, 0, None]
+    assert lca_builder.distance(6, 7) == 2
+    assert lca_builder.distance(6, 5) == 5
+    assert lca_builder.distance(4, 4) == 0
+    assert lca_builder.distance_many([(4, 7), (2, 0)]) == [3, 1]
+    assert path_builder.kth_ancestor(n - 1, n - 1) == 0
+    assert path_builder.distance(n - 1, 0) == n - 1
+
+    grown_builder = LCABuilder(get_graph('input_task2.txt'))
+    grown_builder.build()
+    prev = 7
+    for _ in xrange(40):
+        prev = grown_builder.add_leaf(prev)
+    assert prev == 47 and grown_builder.width > lca_builder.width
+    assert grown_builder.add_leaf(6) == 48
+    assert grown_builder.find(47, 48) == 3
+    assert grown_builder.find(47, 5) == 0
+    assert grown_builder.find(47, 20) == 20 and grown_builder.find(20, 47) == 20
+    assert grown_builder.kth_ancestor(47, 40) == 7
+    assert grown_builder.distance(47, 48) == 43
+    old_pairs = [(first_ver, second_ver) for first_ver in g for second_ver in g]
+    assert grown_builder.find_many(old_pairs) == lca_builder.find_many(old_pairs)
+
+    csr_graph = read_text_graph('input_task2.txt', with_values=False)
+    assert [list(csr_graph[ver]) for ver in csr_graph] == [g[ver] for ver in g]
+    csr_builder = LCABuilder(csr_graph)
+    csr_builder.build()
+    assert csr_builder.find_many(old_pairs) == lca_builder.find_many(old_pairs)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        binary_name = os.path.join(temp_dir, 'graph.csr')
+        save_binary(csr_graph, binary_name)
+        loaded_graph = load_binary(binary_name)
+        assert loaded_graph.offsets == csr_graph.offsets and loaded_graph.targets == csr_graph.targets
+        assert loaded_graph.values is None
+
+        text_name = os.path.join(temp_dir, 'input_task2.txt')
+        shutil.copy('input_task2.txt', text_name)
+        assert load_graph(text_name, with_values=False).targets == csr_graph.targets
+        assert os.path.exists(text_name + '.csr')
+        assert load_graph(text_name, with_values=False).targets == csr_graph.targets
+        with open(text_name, 'w') as f:
+            f.write('2\n1\n0\n')
+        os.utime(text_name, (1, 1))
+        assert list(load_graph(text_name, with_values=False).targets) == [1, 0]
+        assert list(load_binary(text_name + '.csr', source_stat(text_name)).targets) == [1, 0]
+    finally:
+        shutil.rmtree(temp_dir)
+
+    euler_builder = EulerLCABuilder(g)
+    euler_builder.build()
+    pairs = [(first_ver, second_ver) for first_ver in g for second_ver in g]
+    assert euler_builder.find_many(pairs) == lca_builder.find_many(pairs)
+    assert [euler_builder.find(*pair) for pair in pairs] == lca_builder.find_many(pairs)
+
+    path_euler_builder = EulerLCABuilder(path_graph)
+    path_euler_builder.build()
+    assert path_euler_builder.find(n - 1, n // 2) == n // 2
+    assert path_euler_builder.find_many([(n - 1, 0), (5, 7)]) == [0, 5]
+
 
 if __name__ == '__main__':
     main()
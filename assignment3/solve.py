@@ -1,12 +1,30 @@
 # -*- coding: UTF-8 -*-
 
+import argparse
+import hashlib
+import heapq
+import mmap
+import multiprocessing
+import os
+import shutil
+import struct
+import sys
+import tempfile
 import unittest
+import zlib
+
+from array import array
+from collections import OrderedDict
+from StringIO import StringIO
 
 
 class BorNode(object):
     def __init__(self):
         self.edges = {}
         self.word_end = False
+        self.words_count = 0
+        self.weight = 0
+        self.max_weight = 0
 
 
 class Bor(object):
@@ -26,17 +44,29 @@ class Bor(object):
         - max_len_word is the maximal length of word in the dictionary
     * check ifPrefix(string): O(len_string), len_string = len(string)
     * check ifWord(string): O(len_word), len_word = len(word)
+
+    Also Bor can be walked node by node (root attribute and get_child,
+    is_word_node and words_count methods), so a search, that builds the
+    string letter by letter, doesn't walk from the root on every step.
+
+    Every word has weight (sum of weights, with which it was added), and
+    every node keeps maximal weight of word in its subtree, so top k words
+    with some prefix can be found without walking over the whole subtree
+    (see complete method). Last completion_cache_size answers of complete
+    are cached.
     """
-    def __init__(self):
+    def __init__(self, completion_cache_size=1024):
         self.root = BorNode()
+        self.completion_cache_size = completion_cache_size
+        self.completion_cache = OrderedDict()
 
     def build(self, words_list):
         for word in words_list:
             self.add_word(word)
 
-    def add_word(self, word):
+    def add_word(self, word, weight=1):
         """
-        Add word to Bor data structure.
+        Add word with weight (positive number) to Bor data structure.
 
         Starting from root, checking if we can go from current node
         to new one by some letter from word.
@@ -46,14 +76,70 @@ class Bor(object):
         Than make the same step as described above.
 
         When we checked last letter from word, set attribute word_end in
-        last checked Node on True.
+        last checked Node on True. If word is new, increase words_count
+        (number of words in subtree) in all nodes on its path.
+
+        Add weight to the weight of word and update max_weight in all nodes
+        on its path. Cached completions for prefixes of word are removed.
         """
         node = self.root
+        path = [node]
         for letter in word:
             if letter not in node.edges:
                 node.edges[letter] = BorNode()
             node = node.edges[letter]
+            path.append(node)
+
+        node.weight += weight
+        for path_node in path:
+            path_node.max_weight = max(path_node.max_weight, node.weight)
+        if self.completion_cache:
+            for index in xrange(len(word) + 1):
+                self.completion_cache.pop(word[:index], None)
+
+        if node.word_end:
+            return
         node.word_end = True
+        for path_node in path:
+            path_node.words_count += 1
+
+    def complete(self, prefix, k):
+        """
+        Return list of k words with prefix with the biggest weights (words with
+        equal weights are ordered alphabetically).
+
+        Keep heap of subtrees and words, ordered by weight (for subtree it is
+        max_weight of its root, nobody in subtree can be heavier). Take the
+        heaviest element: if it is word, it goes to the answer, if it is
+        subtree, put its word and subtrees of children to the heap. So we go
+        only to the subtrees, that can contain words from answer.
+
+        Answer for prefix is cached for the biggest k, that was asked for it,
+        and smaller k get slice of it.
+        """
+        cached = self.completion_cache.pop(prefix, None)
+        if cached is not None and (len(cached[1]) >= k or cached[0] >= k):
+            self.completion_cache[prefix] = cached
+            return cached[1][:k]
+
+        words = []
+        node = self._get_node(prefix)
+        heap = [(-node.max_weight, prefix, 1, node)] if node is not None else []
+        while heap and len(words) < k:
+            _, string, is_subtree, node = heapq.heappop(heap)
+            if not is_subtree:
+                words.append(string)
+                continue
+            if node.word_end:
+                heapq.heappush(heap, (-node.weight, string, 0, None))
+            for letter, child in node.edges.iteritems():
+                heapq.heappush(heap, (-child.max_weight, string + letter, 1, child))
+
+        if self.completion_cache_size:
+            self.completion_cache[prefix] = (k, words)
+            if len(self.completion_cache) > self.completion_cache_size:
+                self.completion_cache.popitem(last=False)
+        return list(words)
 
     def _get_node(self, word):
         """
@@ -73,6 +159,17 @@ class Bor(object):
             node = node.edges[letter]
         return node
 
+    def get_child(self, node, letter):
+        """Return node, to which we can go from node by letter, or None"""
+        return node.edges.get(letter)
+
+    def is_word_node(self, node):
+        return node.word_end
+
+    def words_count(self, node):
+        """Return number of dictionary words, that start with the string of node"""
+        return node.words_count
+
     def is_prefix(self, string):
         """Checked if we can go over all the words letters in Bor"""
         return self._get_node(string) is not None
@@ -86,12 +183,370 @@ class Bor(object):
         return node is not None and node.word_end
 
 
+class BorQueries(object):
+    """
+    is_prefix and is_word for Bor data structures, that have root, get_child
+    (node, to which we can go from node by letter, or None) and is_word_node.
+    """
+    def _get_node(self, word):
+        node = self.root
+        for letter in word:
+            node = self.get_child(node, letter)
+            if node is None:
+                return None
+        return node
+
+    def is_prefix(self, string):
+        return self._get_node(string) is not None
+
+    def is_word(self, string):
+        node = self._get_node(string)
+        return node is not None and self.is_word_node(node)
+
+
+class PackedBor(BorQueries):
+    """
+    The same Bor data structure with the same methods, but nodes are not
+    Python objects: node is an index in flat arrays, root is node 0.
+
+    For every node keep:
+    * self.first_child[node] - one of the children of node (-1 if no children)
+    * self.next_sibling[node] - next child of the parent of node (-1 if it's the last one)
+    * self.letter[node] - code of the letter on the edge from the parent to node
+    * self.word_end[node] - 1, if some word ends in node
+    * self.word_counts[node] - number of words, that start with the string of node
+
+    So children of node make a linked list, and every node takes 17 bytes
+    instead of BorNode object with its own edges dict.
+
+    Time complexity:
+    * building: O(n * max_len_word * alphabet), where alphabet is maximal
+      number of children of one node
+    * check ifPrefix(string), ifWord(string): O(len_string * alphabet)
+    """
+    def __init__(self):
+        self.root = 0
+        self.first_child = array('i', [-1])
+        self.next_sibling = array('i', [-1])
+        self.letter = array('i', [0])
+        self.word_end = bytearray(1)
+        self.word_counts = array('i', [0])
+
+    def build(self, words_list):
+        for word in words_list:
+            self.add_word(word)
+
+    def add_word(self, word):
+        """
+        The same as Bor.add_word: go down by letters of word, create nodes,
+        that don't exist yet, mark last node as word end and increase
+        self.word_counts on the path if word is new. New node is added to the
+        end of arrays and becomes first child of its parent.
+        """
+        node = self.root
+        path = [node]
+        for letter in word:
+            child = self.get_child(node, letter)
+            if child is None:
+                child = len(self.letter)
+                self.first_child.append(-1)
+                self.next_sibling.append(self.first_child[node])
+                self.letter.append(ord(letter))
+                self.word_end.append(0)
+                self.word_counts.append(0)
+                self.first_child[node] = child
+            node = child
+            path.append(node)
+        if self.word_end[node]:
+            return
+        self.word_end[node] = 1
+        for path_node in path:
+            self.word_counts[path_node] += 1
+
+    def get_child(self, node, letter):
+        """Go over the list of children of node and return child with letter, or None"""
+        if len(letter) != 1:
+            return None
+        code = ord(letter)
+        child = self.first_child[node]
+        while child != -1:
+            if self.letter[child] == code:
+                return child
+            child = self.next_sibling[child]
+        return None
+
+    def is_word_node(self, node):
+        return self.word_end[node] == 1
+
+    def words_count(self, node):
+        return self.word_counts[node]
+
+
+SNAPSHOT_MAGIC = 'BORS'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct('<4sIIQ')
+INT = struct.Struct('<i')
+RANGE = struct.Struct('<ii')
+CHUNK_SIZE = 1 << 20
+
+
+def file_checksum(filename):
+    """
+    Checksum of raw bytes of dictionary file (read by chunks), saved in
+    snapshot header for detecting stale snapshots without parsing dictionary
+    """
+    checksum = 0
+    with open(filename, 'rb') as f:
+        chunk = f.read(CHUNK_SIZE)
+        while chunk:
+            checksum = zlib.crc32(chunk, checksum)
+            chunk = f.read(CHUNK_SIZE)
+    return checksum & 0xffffffff
+
+
+def _write_array(f, values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(f)
+
+
+def save_snapshot(packed_bor, filename, checksum):
+    """
+    Save PackedBor to binary file, that can be queried in place with MappedBor.
+
+    Nodes are renumbered in bfs order, so children of every node go one
+    after another (sorted by letter). File contains header (magic, version,
+    checksum of dictionary file, number of nodes n) and then arrays:
+    child_start (n + 1 little-endian 4-byte integers, children of node are
+    nodes from child_start[node] to child_start[node + 1] - 1), letter and
+    word_counts (n little-endian 4-byte integers each) and word_end (n bytes).
+
+    File is written to a temporary file in the same directory and then renamed
+    to filename, so MappedBor objects, that already map the old snapshot, keep
+    reading the old file instead of the truncated one.
+    """
+    order = [packed_bor.root]
+    child_start = array('i', [1])
+    for node in order:
+        children = []
+        child = packed_bor.first_child[node]
+        while child != -1:
+            children.append((packed_bor.letter[child], child))
+            child = packed_bor.next_sibling[child]
+        order.extend(child for _, child in sorted(children))
+        child_start.append(len(order))
+
+    directory, name = os.path.split(os.path.abspath(filename))
+    fd, temp_filename = tempfile.mkstemp(prefix=name + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, checksum, len(order)))
+            _write_array(f, child_start)
+            _write_array(f, array('i', (packed_bor.letter[node] for node in order)))
+            _write_array(f, array('i', (packed_bor.word_counts[node] for node in order)))
+            f.write(bytearray(packed_bor.word_end[node] for node in order))
+        os.rename(temp_filename, filename)
+    except:
+        os.remove(temp_filename)
+        raise
+
+
+class MappedBor(BorQueries):
+    """
+    Bor, that is read from snapshot file (see save_snapshot) with mmap.
+
+    Nodes are not loaded into memory: every get_child reads range of
+    children of node from the mapped file and searches for the letter among
+    them with one mmap.find call, so opening of the snapshot is O(1) and
+    the OS loads only the pages, that are used by the search. Has the same
+    read methods as PackedBor, but words can't be added.
+
+    Raise ValueError if file is not a snapshot of current version or has
+    wrong size.
+    """
+    def __init__(self, filename):
+        self.root = 0
+        with open(filename, 'rb') as f:
+            header = f.read(SNAPSHOT_HEADER.size)
+            if len(header) != SNAPSHOT_HEADER.size:
+                raise ValueError('{} is not a Bor snapshot'.format(filename))
+            magic, version, self.checksum, self.nodes_count = SNAPSHOT_HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError('{} is not a Bor snapshot of version {}'.format(filename, SNAPSHOT_VERSION))
+            if os.fstat(f.fileno()).st_size != SNAPSHOT_HEADER.size + 4 + 13 * self.nodes_count:
+                raise ValueError('{} has wrong size'.format(filename))
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        column = 4 * self.nodes_count
+        self.child_start_offset = SNAPSHOT_HEADER.size
+        self.letter_offset = self.child_start_offset + column + 4
+        self.word_counts_offset = self.letter_offset + column
+        self.word_end_offset = self.word_counts_offset + column
+        self.letter_codes = {}
+
+    def close(self):
+        self.data.close()
+
+    def get_child(self, node, letter):
+        """
+        Find 4 bytes of letter code in letter column between the first and
+        the last child of node. Match, that doesn't start at the beginning
+        of some letter, is skipped.
+        """
+        code = self.letter_codes.get(letter)
+        if code is None:
+            if len(letter) != 1:
+                return None
+            code = self.letter_codes[letter] = INT.pack(ord(letter))
+        start, end = RANGE.unpack_from(self.data, self.child_start_offset + 4 * node)
+        end = self.letter_offset + 4 * end
+        position = self.data.find(code, self.letter_offset + 4 * start, end)
+        while position != -1 and (position - self.letter_offset) % 4:
+            position = self.data.find(code, position + 1, end)
+        if position == -1:
+            return None
+        return (position - self.letter_offset) // 4
+
+    def is_word_node(self, node):
+        return self.data[self.word_end_offset + node] == '\x01'
+
+    def words_count(self, node):
+        return INT.unpack_from(self.data, self.word_counts_offset + 4 * node)[0]
+
+
+def load_bor(dictionary_filename, filename):
+    """
+    Return MappedBor for dictionary file (see read_words) from snapshot
+    filename. Snapshot is checked by checksum of dictionary file, so valid
+    snapshot is opened without reading words. If there is no snapshot, it
+    has another version or was built from another dictionary (checksum in
+    header is different), read words, build PackedBor, save new snapshot
+    and open it.
+    """
+    checksum = file_checksum(dictionary_filename)
+    try:
+        bor = MappedBor(filename)
+        if bor.checksum == checksum:
+            return bor
+        bor.close()
+    except (IOError, ValueError):
+        pass
+
+    with open(dictionary_filename, 'r') as f:
+        words_list = read_words(f)
+    packed_bor = PackedBor()
+    packed_bor.build(words_list=words_list)
+    save_snapshot(packed_bor, filename, checksum)
+    return MappedBor(filename)
+
+
+class DawgNode(object):
+    __slots__ = ('edges', 'word_end')
+
+    def __init__(self):
+        self.edges = {}
+        self.word_end = False
+
+
+class DawgBor(BorQueries):
+    """
+    Minimal acyclic automaton (DAWG) of dictionary words with the same
+    methods as Bor. Bor merges only common prefixes of words, DAWG also
+    merges common suffixes: two nodes with the same word_end and the same
+    edges (to the same nodes) are replaced by one node.
+
+    Words should be added in sorted order (build sorts them). When a new
+    word is added, nodes of previous word after common prefix with the new
+    word can't change anymore, so they are minimized (see _minimize): every
+    such node is replaced by equal node from self.minimized, or saved there
+    as a new one. Nodes, that are not minimized yet, are kept in
+    self.unchecked as (parent, letter, node). After the last word call
+    finish method to minimize the rest (build does it). After finish nodes
+    of the last word can be shared, so new words can't be added, and
+    self.minimized is dropped to free memory.
+
+    One node can be reached by different prefixes, so number of words under
+    the node is not defined, and words_count returns None.
+
+    Time complexity:
+    * building: O(n * max_len_word), plus sorting of words in build
+    * check ifPrefix(string), ifWord(string): O(len_string)
+    """
+    def __init__(self):
+        self.root = DawgNode()
+        self.previous_word = None
+        self.unchecked = []
+        self.minimized = {}
+
+    def build(self, words_list):
+        for word in sorted(set(words_list)):
+            self.add_word(word)
+        self.finish()
+
+    def add_word(self, word):
+        if self.minimized is None:
+            raise ValueError('Words can not be added after finish')
+        if self.previous_word is not None and word <= self.previous_word:
+            if word == self.previous_word:
+                return
+            raise ValueError('Words should be added in sorted order: {!r} after {!r}'.format(
+                word, self.previous_word,
+            ))
+
+        common_len = 0
+        if self.previous_word is not None:
+            for letter, previous_letter in zip(word, self.previous_word):
+                if letter != previous_letter:
+                    break
+                common_len += 1
+        self._minimize(common_len)
+
+        node = self.unchecked[-1][2] if self.unchecked else self.root
+        for letter in word[common_len:]:
+            child = DawgNode()
+            node.edges[letter] = child
+            self.unchecked.append((node, letter, child))
+            node = child
+        node.word_end = True
+        self.previous_word = word
+
+    def finish(self):
+        self._minimize(0)
+        self.minimized = None
+
+    def _minimize(self, down_to):
+        """Minimize unchecked nodes from the deepest one up to the depth down_to"""
+        while len(self.unchecked) > down_to:
+            parent, letter, node = self.unchecked.pop()
+            key = (node.word_end, tuple(sorted(
+                (edge_letter, id(child)) for edge_letter, child in node.edges.iteritems()
+            )))
+            if key in self.minimized:
+                parent.edges[letter] = self.minimized[key]
+            else:
+                self.minimized[key] = node
+
+    def get_child(self, node, letter):
+        return node.edges.get(letter)
+
+    def is_word_node(self, node):
+        return node.word_end
+
+    def words_count(self, node):
+        return None
+
+
 class GridWordsFinder(object):
     def __init__(self, grid):
         self.grid = grid
+        self.cells = None
+        self.neighbours = None
         self.used = None
         self.bor = None
         self.grid_words = set()
+        self.path = None
+        self.found = None
 
     def find(self, bor):
         """
@@ -99,54 +554,237 @@ class GridWordsFinder(object):
         finding words in dictionary and run finding with method self._find_words
         (described below).
 
+        Before the search grid is flattened (see _build_cells), so cell
+        (i, j) is index i * m + j, and one self.used array is allocated for
+        the whole search.
+
         Return sorted list of dictionary words that can be founded in input grid.
         """
+        self.grid_words = set()
         if not len(self.grid):
             return []
 
         self.bor = bor
-        n, m = len(self.grid), len(self.grid[0])
-        for i in xrange(len(self.grid)):
-            for j in xrange(len(self.grid[0])):
-                self.used = [[False] * m for _ in xrange(n)]
-                self._find_words(i, j, '')
+        self._build_cells()
+        self._find_from_cells(xrange(len(self.cells)))
         return sorted(list(self.grid_words))
 
-    def _find_words(self, i, j, string):
+    def find_parallel(self, bor, processes=None):
         """
-        Method get current position (i, j) in grid and string that is built by
-        going over the grid in previous iterations of this method.
+        The same as self.find, but start cells are split into chunks, and
+        chunks are processed in a pool of processes (processes=None means
+        one process per CPU).
 
-        First check,if string can be a word from dictionary with help of Bor
-        structure (described above). If it's true, add this string to result
-        self.grid_words set (set, because we don't want to save duplicates).
+        Finder (with bor and flattened grid) is saved in module variable
+        before the pool is created, so worker processes get it from fork
+        and nothing except chunks of cell indexes and found words is sent
+        between processes. Sets of found words from all chunks are merged.
+        """
+        global _worker_finder
 
-        Than try to go to the adjacent cells and check, if string + letter from
-        adjacent cell can be a prefix of some word from dictionary. If it's true,
-        go to that cell and continue previous step from it.
+        self.grid_words = set()
+        if not len(self.grid):
+            return []
+
+        self.bor = bor
+        self._build_cells()
+        processes = processes or multiprocessing.cpu_count()
+        chunks = [
+            xrange(start, len(self.cells), processes * 4)
+            for start in xrange(min(processes * 4, len(self.cells)))
+        ]
+
+        _worker_finder = self
+        pool = multiprocessing.Pool(processes)
+        try:
+            for words in pool.imap_unordered(_find_words_in_cells, chunks):
+                self.grid_words.update(words)
+        finally:
+            pool.close()
+            pool.join()
+            _worker_finder = None
+        return sorted(list(self.grid_words))
+
+    def _find_from_cells(self, start_cells):
+        """Run self._find_words for every cell from start_cells as start point"""
+        self.path = []
+        self.found = {}
+        self.used = bytearray(len(self.cells))
+        for cell in start_cells:
+            letter = self.cells[cell]
+            node = self._walk(self.bor.root, letter)
+            if node is None or self._is_exhausted(node):
+                continue
+            self._find_words(cell, node, letter)
+
+    def _build_cells(self):
+        """
+        Save letters of grid in flat list self.cells and for every cell save
+        tuple of indexes of adjacent cells (horizontally, vertically and
+        diagonally) in self.neighbours. So bounds of the grid are checked
+        once here, not on every step of the search.
+        """
+        n, m = len(self.grid), len(self.grid[0])
+        self.cells = [letter for row in self.grid for letter in row]
+        self.neighbours = []
+        for i in xrange(n):
+            for j in xrange(m):
+                self.neighbours.append(tuple(
+                    (i + dx) * m + j + dy
+                    for dx in xrange(-1, 2)
+                    for dy in xrange(-1, 2)
+                    if (dx or dy) and 0 <= i + dx < n and 0 <= j + dy < m
+                ))
 
-        For avoiding go twice in one cell, mark in self.used 2D array (have the
-        same shape as input grid) value for this (x, y) cell as True, if we be
-        in it in previous steps. When stop checking current cell, marked this value
-        in False.
+    def _find_words(self, cell, node, string):
         """
-        self.used[i][j] = True
-        if self.bor.is_word(string):
+        Method get current cell index in flat grid, string that is built by
+        going over the grid in previous iterations of this method, and node
+        of Bor structure (described above), to which string leads.
+
+        First check, if string is a word from dictionary (word ends in node).
+        If it's true, add this string to result self.grid_words set (set,
+        because we don't want to save duplicates).
+
+        Than try to go to the adjacent cells (self.neighbours[cell]) and check,
+        if node has edge named by letter from adjacent cell (or way of edges,
+        if cell has several letters, see _walk). If it's true, string + letter
+        is a prefix of some word from dictionary, so go to that cell and to the
+        node by this way and continue previous step from it. So every step is
+        O(letters in cell) and we never walk Bor from the root again.
+
+        Nodes on the current way are kept in self.path. When new word is
+        found, increase self.found[node] (number of found words that start
+        with the string of node) for all of them. If all the words under
+        some node are found (see _is_exhausted), don't go to it anymore.
+
+        For avoiding go twice in one cell, mark in self.used (one byte for
+        every cell) value for this cell as 1, if we be in it in previous steps.
+        When stop checking current cell, marked this value in 0, so after
+        every start cell self.used is clear again.
+        """
+        self.used[cell] = 1
+        self.path.append(node)
+        if self.bor.is_word_node(node) and string not in self.grid_words:
             self.grid_words.add(string)
+            for path_node in self.path:
+                self.found[path_node] = self.found.get(path_node, 0) + 1
+
+        for to in self.neighbours[cell]:
+            if self.used[to]:
+                continue
+            letter = self.cells[to]
+            child = self._walk(node, letter)
+            if child is None or self._is_exhausted(child):
+                continue
+            self._find_words(to, child, string + letter)
+        self.path.pop()
+        self.used[cell] = 0
+
+    def _walk(self, node, letters):
+        """
+        Go from node by edges named by every letter of the cell (cell can have
+        several letters, like 'QU') and return the last node, or None if Bor
+        has no such way.
+        """
+        for letter in letters:
+            node = self.bor.get_child(node, letter)
+            if node is None:
+                return None
+        return node
+
+    def _is_exhausted(self, node):
+        """
+        Check if all dictionary words under node are already found. Bor
+        may not know number of words under node (words_count returns None),
+        than node is never exhausted.
+        """
+        words_count = self.bor.words_count(node)
+        return words_count is not None and self.found.get(node, 0) >= words_count
+
+
+_worker_finder = None
+
+
+def _find_words_in_cells(start_cells):
+    """Run search in worker process of GridWordsFinder.find_parallel"""
+    _worker_finder.grid_words = set()
+    _worker_finder._find_from_cells(start_cells)
+    return list(_worker_finder.grid_words)
+
+
+class GridBatchSolver(object):
+    """
+    Solve many grids against one dictionary.
+
+    Bor is built once and given to constructor. Answers for last cache_size
+    grids are kept in LRU cache (self.cache) by hash of grid content, so
+    repeated grid is answered without a search. Counters self.hits and
+    self.misses show how often the cache helps.
+    """
+    def __init__(self, bor, cache_size=1024):
+        self.bor = bor
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def solve(self, grid):
+        """Return sorted list of dictionary words, that can be founded in grid"""
+        key = hashlib.sha1(u'\n'.join(u' '.join(row) for row in grid).encode('utf-8')).digest()
+        words = self.cache.pop(key, None)
+        if words is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            words = GridWordsFinder(grid=grid).find(bor=self.bor)
+        self.cache[key] = words
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return list(words)
+
+    def solve_many(self, grids):
+        """Yield answer of self.solve for every grid from grids"""
+        for grid in grids:
+            yield self.solve(grid)
 
-        for dx in xrange(-1, 2):
-            for dy in xrange(-1, 2):
-                if not (
-                    0 <= i + dx < len(self.used) and
-                    0 <= j + dy < len(self.used[0])
-                ):
-                    continue
-                if self.used[i + dx][j + dy]:
-                    continue
-                if not self.bor.is_prefix(string):
-                    continue
-                self._find_words(i + dx, j + dy, string + self.grid[i + dx][j + dy])
-        self.used[i][j] = False
+
+def read_words(f):
+    """
+    Read dictionary from opened file: first line contain number N of words,
+    next N lines contains dictionary words.
+    """
+    words_list = []
+    word_count = int(f.readline().decode('utf-8').strip())
+    for _ in xrange(word_count):
+        words_list.append(f.readline().decode('utf-8').strip())
+    return words_list
+
+
+def read_grid(f):
+    """
+    Read grid from opened file: line with N and M means size of grid, next N
+    lines represent grid row and contain M letters (M columns in the grid).
+    Empty lines before the grid are skipped. Return None if file is over.
+    """
+    line = f.readline()
+    while line and not line.strip():
+        line = f.readline()
+    if not line:
+        return None
+    n, m = map(int, line.decode('utf-8').strip().split())
+    grid = []
+    for i in xrange(n):
+        grid.append(f.readline().decode('utf-8').strip().split())
+    return grid
+
+
+def grids_from_file(f):
+    """Yield grids from opened file one by one (see read_grid)"""
+    grid = read_grid(f)
+    while grid is not None:
+        yield grid
+        grid = read_grid(f)
 
 
 def data_from_file(filename):
@@ -160,18 +798,74 @@ def data_from_file(filename):
     Next N lines represent grid row and contain M letters (M columns in the grid).
     """
     with open(filename, 'r') as f:
-        words_list = []
-        word_count = int(f.readline().decode('utf-8').strip())
-        for _ in xrange(word_count):
-            words_list.append(f.readline().decode('utf-8').strip())
-        n, m = map(int, f.readline().decode('utf-8').strip().split())
-        grid = []
-        for i in xrange(n):
-            grid.append(f.readline().decode('utf-8').strip().split())
+        words_list = read_words(f)
+        grid = read_grid(f)
     return words_list, grid
 
 
+def batch_main(argv):
+    """
+    Command line batch mode:
+
+        python solve.py batch DICTIONARY [GRIDS] [--snapshot FILE] [--cache-size N]
+
+    DICTIONARY has the same format as the beginning of input files (number of
+    words and words), GRIDS (stdin, if not given) contains grids one after
+    another in the same format as in input files. For every grid print one
+    line with found words, separated by spaces. Stdout is flushed after every
+    line, so caller can send one grid and wait for its answer. With --snapshot
+    dictionary is loaded from Bor snapshot (see load_bor), that is rebuilt if
+    it is stale.
+    """
+    parser = argparse.ArgumentParser(prog='solve.py batch')
+    parser.add_argument('dictionary')
+    parser.add_argument('grids', nargs='?')
+    parser.add_argument('--snapshot')
+    parser.add_argument('--cache-size', type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        bor = load_bor(args.dictionary, args.snapshot)
+    else:
+        with open(args.dictionary, 'r') as f:
+            words_list = read_words(f)
+        bor = Bor()
+        bor.build(words_list=words_list)
+
+    solver = GridBatchSolver(bor, cache_size=args.cache_size)
+    grids_file = open(args.grids, 'r') if args.grids else sys.stdin
+    try:
+        for words in solver.solve_many(grids_from_file(grids_file)):
+            sys.stdout.write(u' '.join(words).encode('utf-8') + '\n')
+            sys.stdout.flush()
+    finally:
+        if args.grids:
+            grids_file.close()
+
+
 class TestSolver(unittest.TestCase):
+    example_files = ['input_task_example.txt', 'input_another_language.txt', 'input_different_languages.txt']
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def examples(self, filenames=None):
+        """Yield filename, words list, grid and built Bor for every example input file"""
+        for filename in filenames or self.example_files:
+            words_list, grid = data_from_file(filename)
+            bor = Bor()
+            bor.build(words_list=words_list)
+            yield filename, words_list, grid, bor
+
+    def assertFindsSameWords(self, grid, bor, other_bor):
+        self.assertListEqual(
+            GridWordsFinder(grid=grid).find(bor=other_bor),
+            GridWordsFinder(grid=grid).find(bor=bor),
+        )
+
     def test_bad_grid(self):
         grid = []
         solver = GridWordsFinder(grid)
@@ -205,8 +899,164 @@ class TestSolver(unittest.TestCase):
         solver = GridWordsFinder(grid=grid)
         self.assertListEqual(solver.find(bor=bor), [u'DADDY', u'ЮЛА'])
 
+    def test_word_from_start_cell(self):
+        bor = Bor()
+        bor.build(words_list=[u'A', u'AB', u'BAB'])
+        solver = GridWordsFinder(grid=[[u'A'], [u'B']])
+        self.assertListEqual(solver.find(bor=bor), [u'A', u'AB'])
+
+    def test_bor_is_not_changed_by_search(self):
+        words_list, grid = data_from_file('input_task_example.txt')
+        bor = Bor()
+        bor.build(words_list=words_list + words_list)
+        self.assertEqual(bor.words_count(bor.root), len(words_list))
+        GridWordsFinder(grid=grid).find(bor=bor)
+        self.assertEqual(bor.words_count(bor.root), len(words_list))
+        self.assertTrue(all(bor.is_word(word) for word in words_list))
+        self.assertListEqual(GridWordsFinder(grid=grid).find(bor=bor), [u'CAR', u'CARD', u'CAT'])
+
+    def test_multi_letter_cells(self):
+        words_list, grid = [u'QUIT', u'QUA', u'QI'], [[u'QU', u'I', u'T'], [u'A', u'X', u'X']]
+        bor, packed_bor = Bor(), PackedBor()
+        bor.build(words_list=words_list)
+        packed_bor.build(words_list=words_list)
+        self.assertListEqual(GridWordsFinder(grid=grid).find(bor=bor), [u'QUA', u'QUIT'])
+        self.assertListEqual(GridWordsFinder(grid=grid).find(bor=packed_bor), [u'QUA', u'QUIT'])
+
+    def test_parallel(self):
+        for _, _, grid, bor in self.examples():
+            self.assertListEqual(
+                GridWordsFinder(grid=grid).find_parallel(bor=bor, processes=2),
+                GridWordsFinder(grid=grid).find(bor=bor),
+            )
+        self.assertListEqual(GridWordsFinder(grid=[]).find_parallel(bor=None), [])
+
+    def test_packed_bor(self):
+        for _, words_list, grid, bor in self.examples():
+            packed_bor = PackedBor()
+            packed_bor.build(words_list=words_list)
+            for word in words_list:
+                for index in xrange(len(word) + 1):
+                    self.assertTrue(packed_bor.is_prefix(word[:index]))
+                    self.assertEqual(packed_bor.is_word(word[:index]), bor.is_word(word[:index]))
+            self.assertFalse(packed_bor.is_prefix(u'XYZ'))
+            self.assertEqual(packed_bor.words_count(packed_bor.root), bor.words_count(bor.root))
+            self.assertFindsSameWords(grid, bor, packed_bor)
+
+    def test_dawg_bor(self):
+        for _, words_list, grid, bor in self.examples():
+            dawg_bor = DawgBor()
+            dawg_bor.build(words_list=words_list)
+            for word in words_list:
+                for index in xrange(len(word) + 1):
+                    self.assertTrue(dawg_bor.is_prefix(word[:index]))
+                    self.assertEqual(dawg_bor.is_word(word[:index]), bor.is_word(word[:index]))
+            self.assertFalse(dawg_bor.is_prefix(u'XYZ'))
+            self.assertFindsSameWords(grid, bor, dawg_bor)
+
+    def test_dawg_bor_shares_suffixes(self):
+        dawg_bor = DawgBor()
+        dawg_bor.build(words_list=[u'rats', u'cats', u'bats', u'cat'])
+        nodes, stack = set(), [dawg_bor.root]
+        while stack:
+            node = stack.pop()
+            if id(node) not in nodes:
+                nodes.add(id(node))
+                stack.extend(node.edges.values())
+        self.assertEqual(len(nodes), 8)
+        self.assertTrue(dawg_bor.is_word(u'cat') and not dawg_bor.is_word(u'rat'))
+        self.assertRaises(ValueError, dawg_bor.add_word, u'apple')
+
+    def test_snapshot(self):
+        snapshot_name = os.path.join(self.temp_dir, 'bor.snapshot')
+        for filename, words_list, grid, bor in self.examples(['input_task_example.txt', 'input_different_languages.txt']):
+            mapped_bor = load_bor(filename, snapshot_name)
+            self.assertEqual(mapped_bor.checksum, file_checksum(filename))
+            for word in words_list:
+                self.assertTrue(mapped_bor.is_word(word))
+                self.assertTrue(mapped_bor.is_prefix(word[:-1]))
+            self.assertEqual(mapped_bor.words_count(mapped_bor.root), bor.words_count(bor.root))
+            self.assertFindsSameWords(grid, bor, mapped_bor)
+            mapped_bor.close()
+
+        with open(snapshot_name, 'r+b') as f:
+            f.truncate(SNAPSHOT_HEADER.size + 5)
+        self.assertRaises(ValueError, MappedBor, snapshot_name)
+        mapped_bor = load_bor('input_different_languages.txt', snapshot_name)
+        self.assertTrue(mapped_bor.is_word(u'DADDY'))
+        mapped_bor.close()
+
+        dictionary_name = os.path.join(self.temp_dir, 'dictionary.txt')
+        with open(dictionary_name, 'w') as f:
+            f.write('2\nA\nB\n')
+        mapped_bor = load_bor(dictionary_name, snapshot_name)
+        self.assertTrue(mapped_bor.is_word(u'B'))
+        self.assertFalse(mapped_bor.is_prefix(u'\u4200'))
+        mapped_bor.close()
+        with open(dictionary_name, 'w') as f:
+            f.write('2\nA\nC\n')
+        mapped_bor = load_bor(dictionary_name, snapshot_name)
+        self.assertTrue(mapped_bor.is_word(u'C'))
+        self.assertFalse(mapped_bor.is_prefix(u'B'))
+
+        words_list = [u'WORD{}'.format(index) for index in xrange(20000)]
+        with open(dictionary_name, 'w') as f:
+            f.write('{}\n{}\n'.format(len(words_list), '\n'.join(words_list)))
+        new_mapped_bor = load_bor(dictionary_name, snapshot_name)
+        self.assertTrue(mapped_bor.is_word(u'C'))
+        self.assertFalse(mapped_bor.is_word(u'WORD19999'))
+        self.assertTrue(new_mapped_bor.is_word(u'WORD19999'))
+        self.assertListEqual(sorted(os.listdir(self.temp_dir)), ['bor.snapshot', 'dictionary.txt'])
+        new_mapped_bor.close()
+        mapped_bor.close()
+
+    def test_complete(self):
+        bor = Bor(completion_cache_size=2)
+        bor.build(words_list=[u'CAR', u'CARD', u'CART', u'CAT', u'DOG'])
+        bor.add_word(u'CAT', weight=5)
+        bor.add_word(u'CARD', weight=2)
+        self.assertListEqual(bor.complete(u'C', 2), [u'CAT', u'CARD'])
+        self.assertListEqual(bor.complete(u'C', 10), [u'CAT', u'CARD', u'CAR', u'CART'])
+        self.assertListEqual(bor.complete(u'C', 1), [u'CAT'])
+        self.assertListEqual(bor.complete(u'CAR', 2), [u'CARD', u'CAR'])
+        self.assertListEqual(bor.complete(u'', 2), [u'CAT', u'CARD'])
+        self.assertListEqual(bor.complete(u'X', 2), [])
+        self.assertEqual(len(bor.completion_cache), 2)
+
+        bor.add_word(u'CART', weight=10)
+        self.assertListEqual(bor.complete(u'CAR', 2), [u'CART', u'CARD'])
+        self.assertListEqual(bor.complete(u'', 1), [u'CART'])
+        self.assertEqual(bor.words_count(bor.root), 5)
+
+    def test_finder_reuse(self):
+        words_list, grid = data_from_file('input_task_example.txt')
+        bor = Bor()
+        bor.build(words_list=words_list)
+        solver = GridWordsFinder(grid=grid)
+        self.assertListEqual(solver.find(bor=bor), [u'CAR', u'CARD', u'CAT'])
+        solver.grid = [[u'C', u'A', u'R']]
+        self.assertListEqual(solver.find(bor=bor), [u'CAR'])
+
+    def test_batch_solver(self):
+        words_list, grid = data_from_file('input_task_example.txt')
+        bor = Bor()
+        bor.build(words_list=words_list)
+        grids_file = StringIO('2 2\nC A\nT R\n\n1 3\nC A R\n2 2\nC A\nT R\n')
+        solver = GridBatchSolver(bor, cache_size=1)
+        self.assertListEqual(
+            list(solver.solve_many(grids_from_file(grids_file))),
+            [[u'CAR', u'CART', u'CAT'], [u'CAR'], [u'CAR', u'CART', u'CAT']],
+        )
+        self.assertEqual((solver.hits, solver.misses), (0, 3))
+        self.assertListEqual(solver.solve([[u'C', u'A'], [u'T', u'R']]), [u'CAR', u'CART', u'CAT'])
+        self.assertEqual((solver.hits, solver.misses), (1, 3))
+        self.assertListEqual(solver.solve(grid), [u'CAR', u'CARD', u'CAT'])
+
 
 def main():
+    if sys.argv[1:2] == ['batch']:
+        batch_main(sys.argv[2:])
+        return
     unittest.main()
 
 
@@ -1,7 +1,18 @@
 # -*- coding: UTF-8 -*-
 
+import mmap
+import multiprocessing
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
 import unittest
-import Queue
+
+from array import array
+from collections import deque
+from itertools import chain
 
 
 def bfs(grid, start_x, start_y, used):
@@ -20,15 +31,16 @@ def bfs(grid, start_x, start_y, used):
     Starting from (start_x, start_y) coordinates try to go to horizontally and vertically
     cells. If new cell is water or cell is land and we checked and marked it in previous iterations, don't 
     check this cells. Otherwise marked land-cell, that we be in it, and do the same for it as I write above.
+
+    Cell is marked when it is put to the queue, so every cell is put to the queue only once.
     """
     n_rows = len(grid)
     n_columns = len(grid[0])
 
-    queue = Queue.Queue()
-    queue.put((start_x, start_y))
-    while not queue.empty():
-        x, y = queue.get()
-        used[x][y] = True
+    queue = deque([(start_x, start_y)])
+    used[start_x][start_y] = True
+    while queue:
+        x, y = queue.popleft()
         for dx, dy in zip([-1, 1, 0, 0], [0, 0, 1, -1]):
             if not (0 <= x + dx < n_rows and 0 <= y + dy < n_columns):
                 continue
@@ -36,7 +48,8 @@ def bfs(grid, start_x, start_y, used):
                 continue
             if used[x + dx][y + dy]:
                 continue
-            queue.put((x + dx, y + dy))
+            used[x + dx][y + dy] = True
+            queue.append((x + dx, y + dy))
 
 
 def find_islands(n_rows, n_columns, grid):
@@ -62,6 +75,552 @@ def find_islands(n_rows, n_columns, grid):
     return islands_counter
 
 
+def _find_root(parent, label):
+    """Find root of label in union-find parent array, halving the path on the way"""
+    while parent[label] != label:
+        parent[label] = parent[parent[label]]
+        label = parent[label]
+    return label
+
+
+def label_islands(n_rows, n_columns, grid):
+    """
+    Find all islands and label them with two passes over the grid.
+
+    Return tuple (islands_counter, labels, sizes):
+    * labels - flat array, labels[i * n_columns + j] is number of island of
+      cell (i, j) (islands are numbered from 1 in order of their first cell),
+      or 0 for water
+    * sizes - list, sizes[label - 1] is number of cells of island label
+
+    First pass: go through all cells. Land-cell gets label of its upper or
+    left neighbour, or new label if both of them are water. If upper and left
+    neighbours have different labels, they are in the same island, so union
+    them in union-find (parent array). Root of every set is its smallest label.
+
+    Second pass: replace every label with its root, and number roots from 1
+    in order of appearance. Count size of every island.
+
+    Time complexity: O(n_rows * n_columns * alpha), where alpha is inverse
+    Ackermann function (practically constant).
+    """
+    labels = array('i', [0]) * (n_rows * n_columns)
+    parent = array('i', [0])
+    for i in xrange(n_rows):
+        row = grid[i]
+        for j in xrange(n_columns):
+            if not row[j]:
+                continue
+            cell = i * n_columns + j
+            up = labels[cell - n_columns] if i else 0
+            left = labels[cell - 1] if j else 0
+            if not up and not left:
+                label = len(parent)
+                parent.append(label)
+            elif not up or not left:
+                label = up or left
+            else:
+                up, left = _find_root(parent, up), _find_root(parent, left)
+                label = min(up, left)
+                parent[max(up, left)] = label
+            labels[cell] = label
+
+    new_label = array('i', [0]) * len(parent)
+    sizes = []
+    for cell in xrange(len(labels)):
+        label = labels[cell]
+        if not label:
+            continue
+        root = _find_root(parent, label)
+        if not new_label[root]:
+            sizes.append(0)
+            new_label[root] = len(sizes)
+        labels[cell] = new_label[root]
+        sizes[new_label[root] - 1] += 1
+    return len(sizes), labels, sizes
+
+
+class StreamingIslands(object):
+    """
+    Islands counter, that gets rows of the grid one by one (add_row) and keeps
+    only labels of the previous row in memory.
+
+    Every land-cell of the current row gets label of its upper or left
+    neighbour (or new label), and labels are united in union-find (self.parent)
+    as in label_islands. Labels of the previous row (self.prev) are 0 .. k - 1,
+    new labels of current row are added after them. Also count area of every
+    label (self.area).
+
+    After the row is processed, find sets of labels, that have no cells in
+    the current row: this islands can't grow anymore, so count them (and
+    save their areas to self.areas, if with_areas is True, otherwise
+    self.areas is None and finished islands are only counted). Other sets
+    get new labels 0 .. k' - 1, union-find is started again with them, and
+    the current row becomes previous one. After the last row finish() counts
+    all the remaining sets.
+
+    Memory: O(n_columns), plus O(number of islands) for areas if with_areas is True
+    """
+    def __init__(self, with_areas=False):
+        self.islands_counter = 0
+        self.areas = [] if with_areas else None
+        self.prev = None
+        self.parent = []
+        self.area = []
+
+    def add_row(self, row):
+        parent, area, prev = self.parent, self.area, self.prev
+        cur = [-1] * len(row)
+        for j, value in enumerate(row):
+            if not value:
+                continue
+            up = prev[j] if prev is not None else -1
+            left = cur[j - 1] if j else -1
+            if up == -1 and left == -1:
+                label = len(parent)
+                parent.append(label)
+                area.append(0)
+            elif up == -1 or left == -1:
+                label = max(up, left)
+            else:
+                up, left = _find_root(parent, up), _find_root(parent, left)
+                label = min(up, left)
+                parent[max(up, left)] = label
+            cur[j] = label
+            area[label] += 1
+
+        root_area = {}
+        for label in xrange(len(parent)):
+            root = _find_root(parent, label)
+            root_area[root] = root_area.get(root, 0) + area[label]
+        new_label = {}
+        for label in cur:
+            if label != -1:
+                root = _find_root(parent, label)
+                if root not in new_label:
+                    new_label[root] = len(new_label)
+        for root in sorted(root_area):
+            if root not in new_label:
+                self.islands_counter += 1
+                if self.areas is not None:
+                    self.areas.append(root_area[root])
+
+        self.prev = [new_label[_find_root(parent, label)] if label != -1 else -1 for label in cur]
+        self.parent = range(len(new_label))
+        self.area = [0] * len(new_label)
+        for root, label in new_label.iteritems():
+            self.area[label] = root_area[root]
+
+    def finish(self):
+        """Count islands, that reach the last row, and return number of islands"""
+        self.islands_counter += len(self.parent)
+        if self.areas is not None:
+            self.areas.extend(self.area)
+        self.prev, self.parent, self.area = None, [], []
+        return self.islands_counter
+
+
+def count_islands_streaming(rows, with_areas=False):
+    """
+    Parameters:
+    -----------
+    rows: iterable
+        rows of the grid one by one (lists of values from {0, 1})
+    with_areas: bool
+        if True, also return list of areas (number of cells) of islands
+
+    Count islands with StreamingIslands, keeping only labels of the previous
+    row in memory. Areas are listed in order in which islands are finished.
+
+    Time complexity: O(n_rows * n_columns * alpha)
+    Memory: O(n_columns), plus O(number of islands) if with_areas is True
+    """
+    counter = StreamingIslands(with_areas=with_areas)
+    for row in rows:
+        counter.add_row(row)
+    counter.finish()
+    if with_areas:
+        return counter.islands_counter, counter.areas
+    return counter.islands_counter
+
+
+class DynamicIslands(object):
+    """
+    Number of islands in the grid, where land-cells are added one by one.
+
+    Cells are numbered x * n_columns + y. Every island is a set in union-find
+    over flat arrays: self.parent (parent of cell in the set tree) and
+    self.rank (upper bound of height of the set tree), self.land marks
+    land-cells. Sets are united by rank and paths are compressed on find, so
+    every operation is amortized O(alpha), where alpha is inverse Ackermann
+    function (practically constant).
+
+    New land-cell is a new island, and every union with neighbouring island
+    decreases number of islands by one.
+    """
+    def __init__(self, n_rows, n_columns, grid=None):
+        self.n_rows = n_rows
+        self.n_columns = n_columns
+        self.parent = array('i', xrange(n_rows * n_columns))
+        self.rank = bytearray(n_rows * n_columns)
+        self.land = bytearray(n_rows * n_columns)
+        self.islands_counter = 0
+        if grid is not None:
+            self.add_lands((i, j) for i in xrange(n_rows) for j in xrange(n_columns) if grid[i][j])
+
+    def _find(self, cell):
+        root = cell
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[cell] != root:
+            self.parent[cell], cell = root, self.parent[cell]
+        return root
+
+    def _union(self, first, second):
+        """Unite sets of two cells, return False if they are already in one set"""
+        first, second = self._find(first), self._find(second)
+        if first == second:
+            return False
+        if self.rank[first] < self.rank[second]:
+            first, second = second, first
+        self.parent[second] = first
+        if self.rank[first] == self.rank[second]:
+            self.rank[first] += 1
+        return True
+
+    def add_land(self, x, y):
+        """Make cell (x, y) land and return new number of islands"""
+        if not (0 <= x < self.n_rows and 0 <= y < self.n_columns):
+            raise IndexError('Cell ({}, {}) is out of the grid'.format(x, y))
+        cell = x * self.n_columns + y
+        if self.land[cell]:
+            return self.islands_counter
+        self.land[cell] = 1
+        self.islands_counter += 1
+        for dx, dy in zip([-1, 1, 0, 0], [0, 0, 1, -1]):
+            if not (0 <= x + dx < self.n_rows and 0 <= y + dy < self.n_columns):
+                continue
+            if self.land[cell + dx * self.n_columns + dy] and self._union(cell, cell + dx * self.n_columns + dy):
+                self.islands_counter -= 1
+        return self.islands_counter
+
+    def add_lands(self, cells):
+        """Make all cells (x, y) from cells land and return new number of islands"""
+        for x, y in cells:
+            self.add_land(x, y)
+        return self.islands_counter
+
+
+_worker_grid = None
+
+
+def _label_strip(bounds):
+    """
+    Label rows [row_start, row_end) of the shared grid in worker process of
+    count_islands_parallel. Return number of islands in the strip, their
+    sizes and labels of the first and the last rows of the strip.
+    """
+    row_start, row_end = bounds
+    cells, n_columns = _worker_grid
+    strip = [cells[i * n_columns:(i + 1) * n_columns] for i in xrange(row_start, row_end)]
+    islands_counter, labels, sizes = label_islands(row_end - row_start, n_columns, strip)
+    return islands_counter, sizes, labels[:n_columns], labels[len(labels) - n_columns:]
+
+
+def count_islands_parallel(n_rows, n_columns, grid, processes=None):
+    """
+    Count islands and their sizes in a pool of processes (processes=None
+    means one process per CPU). Return tuple (islands_counter, sizes) equal
+    to the first and the last elements of label_islands result.
+
+    Grid is copied to shared memory (multiprocessing.RawArray) and split into
+    horizontal strips. Every strip is labelled with label_islands in its own
+    process. Label l of strip s becomes global label offset[s] + l, where
+    offset[s] is number of islands in previous strips.
+
+    Islands, that cross border between strips, have parts in both strips:
+    for every column, if last row of strip s and first row of strip s + 1
+    are land, union their global labels in union-find. Root of every set is
+    its smallest global label, i.e. label of its first cell in the whole
+    grid, so roots numbered in increasing order give the same order of
+    islands as label_islands.
+    """
+    global _worker_grid
+
+    if not n_rows or not n_columns:
+        return 0, []
+    processes = processes or multiprocessing.cpu_count()
+    strips_count = min(processes, n_rows)
+    bounds = [
+        (n_rows * index // strips_count, n_rows * (index + 1) // strips_count)
+        for index in xrange(strips_count)
+    ]
+
+    cells = multiprocessing.RawArray('b', n_rows * n_columns)
+    for i in xrange(n_rows):
+        cells[i * n_columns:(i + 1) * n_columns] = [1 if value else 0 for value in grid[i]]
+
+    _worker_grid = (cells, n_columns)
+    pool = multiprocessing.Pool(processes)
+    try:
+        strips = pool.map(_label_strip, bounds)
+    finally:
+        pool.close()
+        pool.join()
+        _worker_grid = None
+
+    offsets = []
+    strip_sizes = [0]
+    for islands_counter, sizes, top, bottom in strips:
+        offsets.append(len(strip_sizes) - 1)
+        strip_sizes.extend(sizes)
+    parent = array('i', xrange(len(strip_sizes)))
+    for index in xrange(1, len(strips)):
+        bottom, top = strips[index - 1][3], strips[index][2]
+        for j in xrange(n_columns):
+            if not bottom[j] or not top[j]:
+                continue
+            first = _find_root(parent, offsets[index - 1] + bottom[j])
+            second = _find_root(parent, offsets[index] + top[j])
+            parent[max(first, second)] = min(first, second)
+
+    root_sizes = {}
+    for label in xrange(1, len(strip_sizes)):
+        root = _find_root(parent, label)
+        root_sizes[root] = root_sizes.get(root, 0) + strip_sizes[label]
+    return len(root_sizes), [root_sizes[root] for root in sorted(root_sizes)]
+
+
+def rows_from_file(filename):
+    """
+    Get rows of the grid from file (the same format as in data_from_file)
+    one by one, without loading the whole grid.
+    """
+    with open(filename, 'r') as f:
+        n_rows, n_columns = map(int, f.readline().decode('UTF-8').strip().split())
+        for _ in xrange(n_rows):
+            values = map(int, f.readline().decode('UTF-8').strip().split())
+            assert len(values) == n_columns
+            yield values
+
+
+PACKED_MAGIC = 'ISL1'
+PACKED_HEADER = struct.Struct('<4sII')
+_BITS = [tuple((byte >> (7 - bit)) & 1 for bit in xrange(8)) for byte in xrange(256)]
+
+
+def _pack_row(row):
+    """Pack row of {0, 1} values to bytes, 8 cells in byte, first cell in the highest bit"""
+    packed = bytearray((len(row) + 7) // 8)
+    for j, value in enumerate(row):
+        if value:
+            packed[j >> 3] |= 0x80 >> (j & 7)
+    return packed
+
+
+def convert_to_packed(filename, packed_filename):
+    """
+    Convert grid from text file (the same format as in data_from_file) to
+    packed binary file, reading it row by row.
+
+    Packed file contains header (magic 'ISL1', number of rows and number of
+    columns as little-endian 4-byte integers) and then rows, every row takes
+    (n_columns + 7) // 8 bytes, one bit for a cell.
+    """
+    with open(filename, 'r') as f:
+        n_rows, n_columns = map(int, f.readline().decode('UTF-8').strip().split())
+    with open(packed_filename, 'wb') as f:
+        f.write(PACKED_HEADER.pack(PACKED_MAGIC, n_rows, n_columns))
+        for row in rows_from_file(filename):
+            f.write(_pack_row(row))
+
+
+class PackedGrid(object):
+    """
+    Grid from packed binary file (see convert_to_packed), mapped to memory
+    with mmap. Rows are unpacked only when they are requested, so the grid
+    is never loaded into memory as a whole.
+
+    Raise ValueError if file is not a packed grid or has wrong size.
+    """
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            header = f.read(PACKED_HEADER.size)
+            if len(header) != PACKED_HEADER.size:
+                raise ValueError('{} is not a packed grid'.format(filename))
+            magic, self.n_rows, self.n_columns = PACKED_HEADER.unpack(header)
+            if magic != PACKED_MAGIC:
+                raise ValueError('{} is not a packed grid'.format(filename))
+            self.row_size = (self.n_columns + 7) // 8
+            if os.fstat(f.fileno()).st_size != PACKED_HEADER.size + self.n_rows * self.row_size:
+                raise ValueError('{} has wrong size'.format(filename))
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.n_rows * self.row_size else ''
+
+    def close(self):
+        if self.data:
+            self.data.close()
+
+    def row(self, i):
+        """Return row i as list of {0, 1} values"""
+        start = PACKED_HEADER.size + i * self.row_size
+        packed = bytearray(self.data[start:start + self.row_size])
+        return list(chain.from_iterable(_BITS[byte] for byte in packed))[:self.n_columns]
+
+    def rows(self):
+        for i in xrange(self.n_rows):
+            yield self.row(i)
+
+
+def count_islands_packed(packed_filename, with_areas=False):
+    """
+    Count islands (and their areas, if with_areas is True) in packed grid
+    file with count_islands_streaming. Without areas only few rows are in
+    memory, with areas the list of areas also grows with number of islands.
+    """
+    grid = PackedGrid(packed_filename)
+    try:
+        return count_islands_streaming(grid.rows(), with_areas=with_areas)
+    finally:
+        grid.close()
+
+
+INDEX_MAGIC = 'ISX1'
+INDEX_HEADER = struct.Struct('<4sIII')
+
+
+class IslandIndex(object):
+    """
+    Island of every cell and statistics of every island for O(1) queries.
+
+    build method labels the grid with label_islands and then with one pass
+    over the labels finds for every island (label = 1 .. self.islands_counter,
+    tables are indexed by label - 1):
+    * self.areas - number of cells
+    * self.min_rows, self.min_columns, self.max_rows, self.max_columns - bounding box
+    * self.perimeters - number of cell sides, that border water or edge of the grid
+
+    Labels and tables are flat 4-byte arrays, they can be saved to binary file
+    and loaded back without labelling the grid again (save and load methods).
+    New index is empty, it gets size of the grid from build or load.
+    """
+    def __init__(self):
+        self.n_rows = 0
+        self.n_columns = 0
+        self.islands_counter = 0
+        self.labels = array('i')
+        self.areas = array('i')
+        self.min_rows = array('i')
+        self.min_columns = array('i')
+        self.max_rows = array('i')
+        self.max_columns = array('i')
+        self.perimeters = array('i')
+
+    def build(self, n_rows, n_columns, grid):
+        self.n_rows, self.n_columns = n_rows, n_columns
+        self.islands_counter, labels, sizes = label_islands(n_rows, n_columns, grid)
+        self.labels = labels
+        self.areas = array('i', sizes)
+        self.min_rows = array('i', [n_rows]) * self.islands_counter
+        self.min_columns = array('i', [n_columns]) * self.islands_counter
+        self.max_rows = array('i', [-1]) * self.islands_counter
+        self.max_columns = array('i', [-1]) * self.islands_counter
+        self.perimeters = array('i', [0]) * self.islands_counter
+
+        for i in xrange(n_rows):
+            for j in xrange(n_columns):
+                label = labels[i * n_columns + j]
+                if not label:
+                    continue
+                index = label - 1
+                self.min_rows[index] = min(self.min_rows[index], i)
+                self.max_rows[index] = max(self.max_rows[index], i)
+                self.min_columns[index] = min(self.min_columns[index], j)
+                self.max_columns[index] = max(self.max_columns[index], j)
+                for dx, dy in zip([-1, 1, 0, 0], [0, 0, 1, -1]):
+                    if not (
+                        0 <= i + dx < n_rows and 0 <= j + dy < n_columns and
+                        labels[(i + dx) * n_columns + j + dy]
+                    ):
+                        self.perimeters[index] += 1
+
+    def island_at(self, x, y):
+        """Return label of island of cell (x, y), or 0 if it is water"""
+        if not (0 <= x < self.n_rows and 0 <= y < self.n_columns):
+            raise IndexError('Cell ({}, {}) is out of the grid'.format(x, y))
+        return self.labels[x * self.n_columns + y]
+
+    def area(self, label):
+        return self.areas[label - 1]
+
+    def bounding_box(self, label):
+        """Return (min_row, min_column, max_row, max_column) of island"""
+        index = label - 1
+        return self.min_rows[index], self.min_columns[index], self.max_rows[index], self.max_columns[index]
+
+    def perimeter(self, label):
+        return self.perimeters[label - 1]
+
+    def query(self, x, y):
+        """Return (label, area, bounding box, perimeter) of island of cell (x, y), or None for water"""
+        label = self.island_at(x, y)
+        if not label:
+            return None
+        return label, self.area(label), self.bounding_box(label), self.perimeter(label)
+
+    def query_many(self, cells):
+        """Return list of answers of self.query for every cell (x, y) from cells"""
+        query = self.query
+        return [query(x, y) for x, y in cells]
+
+    def _tables(self):
+        return [
+            self.labels, self.areas, self.min_rows, self.min_columns,
+            self.max_rows, self.max_columns, self.perimeters,
+        ]
+
+    def save(self, filename):
+        """
+        Save index to binary file: header (magic 'ISX1', number of rows, columns
+        and islands) and then labels and tables as little-endian 4-byte integers.
+        """
+        with open(filename, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.n_rows, self.n_columns, self.islands_counter))
+            for table in self._tables():
+                if sys.byteorder != 'little':
+                    table = array('i', table)
+                    table.byteswap()
+                table.tofile(f)
+
+    def load(self, filename):
+        """
+        Load index saved with save method, raise ValueError if file is not an
+        index. Header and tables are read into local variables and index is
+        changed only after all of them are loaded, so failed load keeps it.
+        """
+        with open(filename, 'rb') as f:
+            header = f.read(INDEX_HEADER.size)
+            if len(header) != INDEX_HEADER.size:
+                raise ValueError('{} is not an islands index'.format(filename))
+            magic, n_rows, n_columns, islands_counter = INDEX_HEADER.unpack(header)
+            if magic != INDEX_MAGIC:
+                raise ValueError('{} is not an islands index'.format(filename))
+            tables = []
+            for count in [n_rows * n_columns] + [islands_counter] * 6:
+                table = array('i')
+                try:
+                    table.fromfile(f, count)
+                except EOFError:
+                    raise ValueError('{} is truncated'.format(filename))
+                if sys.byteorder != 'little':
+                    table.byteswap()
+                tables.append(table)
+        self.n_rows, self.n_columns, self.islands_counter = n_rows, n_columns, islands_counter
+        (
+            self.labels, self.areas, self.min_rows, self.min_columns,
+            self.max_rows, self.max_columns, self.perimeters,
+        ) = tables
+
+
 def data_from_file(filename):
     """
     Get input grid from file.
@@ -85,6 +644,20 @@ def data_from_file(filename):
 
 
 class TestSolver(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def random_grids(self, seed, count, max_size):
+        """Yield count random grids (n_rows, n_columns, grid) with sizes up to max_size"""
+        generator = random.Random(seed)
+        for _ in xrange(count):
+            n_rows, n_columns = generator.randint(1, max_size), generator.randint(1, max_size)
+            grid = [[int(generator.random() < 0.55) for _ in xrange(n_columns)] for _ in xrange(n_rows)]
+            yield n_rows, n_columns, grid
+
     def test_no_grid(self):
         n_rows, n_columns, grid = data_from_file('inputs/input_no_grid.txt')
         self.assertEqual(find_islands(n_rows, n_columns, grid), 0)
@@ -101,6 +674,147 @@ class TestSolver(unittest.TestCase):
         n_rows, n_columns, grid = data_from_file('inputs/input_many_islands.txt')
         self.assertEqual(find_islands(n_rows, n_columns, grid), 4)
 
+    def test_label_islands(self):
+        n_rows, n_columns, grid = data_from_file('inputs/input_many_islands.txt')
+        islands_counter, labels, sizes = label_islands(n_rows, n_columns, grid)
+        self.assertEqual(islands_counter, 4)
+        self.assertListEqual(sizes, [2, 9, 1, 1])
+        self.assertListEqual(list(labels), [
+            1, 0, 0, 2, 0,
+            1, 0, 2, 2, 2,
+            0, 0, 2, 0, 2,
+            3, 0, 2, 2, 2,
+            0, 4, 0, 0, 0,
+        ])
+
+    def test_label_islands_same_as_find_islands(self):
+        for filename in ['input_no_islands.txt', 'input_islands_near_fringe.txt', 'input_no_greed.txt']:
+            n_rows, n_columns, grid = data_from_file('inputs/' + filename)
+            islands_counter, labels, sizes = label_islands(n_rows, n_columns, grid)
+            self.assertEqual(islands_counter, find_islands(n_rows, n_columns, grid))
+            self.assertEqual(sum(sizes), sum(map(sum, grid)))
+
+    def test_label_islands_merge(self):
+        grid = [
+            [1, 0, 1, 0, 1],
+            [1, 0, 1, 0, 1],
+            [1, 1, 1, 1, 1],
+        ]
+        islands_counter, labels, sizes = label_islands(3, 5, grid)
+        self.assertEqual(islands_counter, 1)
+        self.assertListEqual(sizes, [11])
+
+    def test_count_islands_streaming(self):
+        rows = rows_from_file('inputs/input_many_islands.txt')
+        self.assertEqual(count_islands_streaming(rows, with_areas=True), (4, [2, 1, 9, 1]))
+        for filename in ['input_no_islands.txt', 'input_islands_near_fringe.txt', 'input_no_greed.txt']:
+            n_rows, n_columns, grid = data_from_file('inputs/' + filename)
+            self.assertEqual(
+                count_islands_streaming(rows_from_file('inputs/' + filename)),
+                find_islands(n_rows, n_columns, grid),
+            )
+
+    def test_count_islands_streaming_random(self):
+        for n_rows, n_columns, grid in self.random_grids(seed=17, count=20, max_size=15):
+            islands_counter, labels, sizes = label_islands(n_rows, n_columns, grid)
+            streaming_counter, areas = count_islands_streaming(iter(grid), with_areas=True)
+            self.assertEqual(streaming_counter, islands_counter)
+            self.assertListEqual(sorted(areas), sorted(sizes))
+
+    def test_streaming_keeps_only_row_state(self):
+        counter = StreamingIslands()
+        for index in xrange(400):
+            counter.add_row([1, 0] * 5 if index % 2 == 0 else [0] * 10)
+            self.assertLessEqual(len(counter.parent), 10)
+            self.assertLessEqual(len(counter.area), 10)
+        self.assertEqual(counter.finish(), 1000)
+        self.assertIsNone(counter.areas)
+
+    def test_count_islands_parallel(self):
+        n_rows, n_columns, grid = data_from_file('inputs/input_many_islands.txt')
+        self.assertEqual(count_islands_parallel(n_rows, n_columns, grid, processes=3), (4, [2, 9, 1, 1]))
+        self.assertEqual(count_islands_parallel(0, 0, [], processes=2), (0, []))
+
+        for n_rows, n_columns, grid in self.random_grids(seed=23, count=5, max_size=30):
+            islands_counter, labels, sizes = label_islands(n_rows, n_columns, grid)
+            self.assertEqual(count_islands_parallel(n_rows, n_columns, grid, processes=4), (islands_counter, sizes))
+
+    def test_dynamic_islands(self):
+        n_rows, n_columns, grid = data_from_file('inputs/input_many_islands.txt')
+        islands = DynamicIslands(n_rows, n_columns, grid)
+        self.assertEqual(islands.islands_counter, 4)
+        self.assertEqual(islands.add_land(4, 0), 3)
+        self.assertEqual(islands.add_land(4, 0), 3)
+        self.assertEqual(islands.add_land(0, 4), 3)
+        self.assertEqual(islands.add_land(2, 1), 3)
+        self.assertEqual(islands.add_lands([(0, 1), (0, 2), (4, 4)]), 2)
+        self.assertEqual(islands.add_lands([(2, 0)]), 1)
+        self.assertRaises(IndexError, islands.add_land, 5, 0)
+
+    def test_dynamic_islands_random(self):
+        generator = random.Random(29)
+        n_rows, n_columns = 12, 9
+        islands = DynamicIslands(n_rows, n_columns)
+        grid = [[0] * n_columns for _ in xrange(n_rows)]
+        for _ in xrange(80):
+            x, y = generator.randrange(n_rows), generator.randrange(n_columns)
+            grid[x][y] = 1
+            self.assertEqual(islands.add_land(x, y), find_islands(n_rows, n_columns, grid))
+
+    def test_packed_grid(self):
+        packed_filename = os.path.join(self.temp_dir, 'grid.bin')
+        for filename in ['input_no_islands.txt', 'input_islands_near_fringe.txt',
+                         'input_many_islands.txt', 'input_no_greed.txt']:
+            convert_to_packed('inputs/' + filename, packed_filename)
+            n_rows, n_columns, grid = data_from_file('inputs/' + filename)
+            packed_grid = PackedGrid(packed_filename)
+            self.assertEqual((packed_grid.n_rows, packed_grid.n_columns), (n_rows, n_columns))
+            self.assertListEqual(list(packed_grid.rows()), grid)
+            packed_grid.close()
+            self.assertEqual(
+                count_islands_packed(packed_filename, with_areas=True),
+                count_islands_streaming(iter(grid), with_areas=True),
+            )
+
+        with open(packed_filename, 'wb') as f:
+            f.write(PACKED_HEADER.pack(PACKED_MAGIC, 3, 9) + '\x00' * 5)
+        self.assertRaises(ValueError, PackedGrid, packed_filename)
+
+    def test_island_index(self):
+        n_rows, n_columns, grid = data_from_file('inputs/input_many_islands.txt')
+        index = IslandIndex()
+        index.build(n_rows, n_columns, grid)
+        self.assertEqual(index.islands_counter, 4)
+        self.assertEqual(index.island_at(2, 4), 2)
+        self.assertEqual(index.island_at(0, 1), 0)
+        self.assertEqual(index.area(2), 9)
+        self.assertEqual(index.bounding_box(2), (0, 2, 3, 4))
+        self.assertEqual(index.perimeter(2), 18)
+        self.assertEqual(index.perimeter(1), 6)
+        self.assertListEqual(
+            index.query_many([(1, 0), (4, 1), (4, 4)]),
+            [(1, 2, (0, 0, 1, 0), 6), (4, 1, (4, 1, 4, 1), 4), None],
+        )
+        self.assertRaises(IndexError, index.island_at, 5, 5)
+
+        index_filename = os.path.join(self.temp_dir, 'index.bin')
+        index.save(index_filename)
+        loaded_index = IslandIndex()
+        loaded_index.load(index_filename)
+        self.assertEqual(loaded_index.islands_counter, 4)
+        self.assertListEqual(loaded_index.query_many([(1, 0), (2, 4)]), index.query_many([(1, 0), (2, 4)]))
+        small_index = IslandIndex()
+        small_index.build(1, 3, [[1, 0, 1]])
+        small_index.save(index_filename)
+        with open(index_filename, 'r+b') as f:
+            f.truncate(INDEX_HEADER.size + 10)
+        self.assertRaises(ValueError, loaded_index.load, index_filename)
+        self.assertEqual(
+            (loaded_index.n_rows, loaded_index.n_columns, loaded_index.islands_counter),
+            (n_rows, n_columns, 4),
+        )
+        self.assertListEqual(loaded_index.query_many([(1, 0), (2, 4)]), index.query_many([(1, 0), (2, 4)]))
+
 
 def main():
     unittest.main()
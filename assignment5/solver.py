@@ -6,7 +6,8 @@ Using the topological sort, build resulting alphabet.
 
 import unittest
 
-from collections import defaultdict
+from collections import defaultdict, deque
+from itertools import izip
 
 
 class AlphabetBuilder(object):
@@ -67,6 +68,90 @@ class AlphabetBuilder(object):
         self.alphabet.append(ver)
 
 
+class KahnAlphabetBuilder(object):
+    """
+    Another way to build alphabet, that checks if the words can be ordered by some alphabet.
+
+    Graph of letter relations keeps edges in sets (self.graph[A] is set of
+    letters B with A -> B), so every relation is saved once, and number of
+    incoming edges of every letter is kept in self.in_degree. Words are read
+    one by one and only the previous word is needed, so words can be any
+    iterable (for example, lines of the file).
+
+    Alphabet is built with Kahn's algorithm: take letter without incoming
+    edges, put it to the alphabet and remove its edges, repeat.
+    * If at some moment there are no such letters, but not all letters are in
+      the alphabet, remaining letters contain a cycle (A goes before B and B
+      before A), so ValueError is raised. ValueError is also raised, if some
+      word goes before its own prefix.
+    * If at some moment there are several such letters, their order is not
+      defined by the words, so alphabet is not unique: self.is_ambiguous is
+      set to True (and ValueError is raised, if builder is strict). Letters
+      are taken in order of their first appearance in the words.
+
+    Time complexity: O(total length of the words + number of letters)
+    """
+    def __init__(self, strict=False):
+        self.strict = strict
+        self.graph = None
+        self.in_degree = None
+        self.letters = None
+        self.alphabet = None
+        self.is_ambiguous = None
+
+    def get_alphabet(self, words):
+        self._build_graph(words)
+        self._find_alphabet()
+        return self.alphabet
+
+    def _build_graph(self, words):
+        self.graph = {}
+        self.in_degree = {}
+        self.letters = []
+        previous_word = None
+        for word in words:
+            for letter in word:
+                if letter not in self.graph:
+                    self.graph[letter] = set()
+                    self.in_degree[letter] = 0
+                    self.letters.append(letter)
+            if previous_word is not None:
+                self._add_relation(previous_word, word)
+            previous_word = word
+
+    def _add_relation(self, word_first, word_second):
+        """Find first different letters A and B of two neighboring words and save A -> B"""
+        for letter_first, letter_second in izip(word_first, word_second):
+            if letter_first != letter_second:
+                if letter_second not in self.graph[letter_first]:
+                    self.graph[letter_first].add(letter_second)
+                    self.in_degree[letter_second] += 1
+                return
+        if len(word_first) > len(word_second):
+            raise ValueError(u'Word "{}" goes before its prefix "{}"'.format(word_first, word_second))
+
+    def _find_alphabet(self):
+        self.alphabet = []
+        self.is_ambiguous = False
+        in_degree = dict(self.in_degree)
+        queue = deque(letter for letter in self.letters if not in_degree[letter])
+        while queue:
+            if len(queue) > 1:
+                self.is_ambiguous = True
+                if self.strict:
+                    raise ValueError(u'Order of letters {} is not defined'.format(u', '.join(queue)))
+            letter = queue.popleft()
+            self.alphabet.append(letter)
+            for to in self.graph[letter]:
+                in_degree[to] -= 1
+                if not in_degree[to]:
+                    queue.append(to)
+
+        if len(self.alphabet) < len(self.letters):
+            cycle_letters = [letter for letter in self.letters if in_degree[letter]]
+            raise ValueError(u'Contradictory order of letters {}'.format(u', '.join(cycle_letters)))
+
+
 def data_from_file(filename):
     """
     Get input words from file.
@@ -99,6 +184,46 @@ class TestSolver(unittest.TestCase):
         words = data_from_file('input/similar_words.txt')
         self.assertListEqual(AlphabetBuilder().get_alphabet(words), [u'c', u'a', u's', u'e'])
 
+    def check_alphabet(self, words, alphabet):
+        position = dict((letter, index) for index, letter in enumerate(alphabet))
+        self.assertEqual(set(position), set(u''.join(words)))
+        for word_first, word_second in zip(words, words[1:]):
+            first_key = [position[letter] for letter in word_first]
+            second_key = [position[letter] for letter in word_second]
+            self.assertLessEqual(first_key, second_key)
+
+    def test_kahn_google_test(self):
+        words = data_from_file('input/google_test.txt')
+        builder = KahnAlphabetBuilder()
+        self.assertListEqual(builder.get_alphabet(words), [u'a', u't', u'r', u'c'])
+        self.assertTrue(builder.is_ambiguous)
+        self.check_alphabet(words, builder.alphabet)
+        self.assertRaises(ValueError, KahnAlphabetBuilder(strict=True).get_alphabet, words)
+
+    def test_kahn_same_as_dfs(self):
+        for filename in ['no_words.txt', 'only_one_letter.txt', 'similar_words.txt']:
+            words = data_from_file('input/' + filename)
+            builder = KahnAlphabetBuilder(strict=True)
+            self.assertListEqual(builder.get_alphabet(words), AlphabetBuilder().get_alphabet(words))
+            self.assertFalse(builder.is_ambiguous)
+
+    def test_kahn_different_case(self):
+        words = data_from_file('input/different_case.txt')
+        builder = KahnAlphabetBuilder()
+        self.check_alphabet(words, builder.get_alphabet(iter(words)))
+        self.assertTrue(builder.is_ambiguous)
+
+    def test_kahn_duplicate_edges(self):
+        builder = KahnAlphabetBuilder(strict=True)
+        self.assertListEqual(builder.get_alphabet([u'ab', u'b', u'ba', u'bb']), [u'a', u'b'])
+        builder.get_alphabet([u'ac', u'ad', u'bc', u'bd', u'cd'])
+        self.assertEqual(builder.graph[u'c'], set([u'd']))
+        self.assertEqual(builder.in_degree[u'd'], 1)
+
+    def test_kahn_contradiction(self):
+        self.assertRaises(ValueError, KahnAlphabetBuilder().get_alphabet, [u'ab', u'ba', u'aa'])
+        self.assertRaises(ValueError, KahnAlphabetBuilder().get_alphabet, [u'abc', u'ab'])
+
 
 def main():
     unittest.main()